@@ -0,0 +1,329 @@
+"""
+Benchmarks for the LLM tools, run against fake_ollama_server
+
+Run with:
+
+    python benchmark_ollama.py
+"""
+
+import contextlib
+import io
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fake_ollama_server import start_fake_server
+
+# the module-level ollama functions read OLLAMA_HOST when ollama is first
+# imported, so start the fake server before any tool makes a call
+SERVER = start_fake_server(num_ctx=4096, parallel=4)
+os.environ["OLLAMA_HOST"] = SERVER.url
+
+import ollama_client
+import token_budget
+import tool_anti_hallucination
+import tool_judge_results
+import tool_llm_eval
+import tool_summarize_text
+from short_programs.OpenAI_compatibility_example import OllamaClient
+
+logging.getLogger().setLevel(logging.WARNING)
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+
+def separator(title: str):
+    """Prints a section separator"""
+    print(f"\n{'=' * 50}")
+    print(f" {title}")
+    print('=' * 50)
+
+
+def server_stats_delta(before: dict) -> dict:
+    return {key: SERVER.stats[key] - before[key] for key in before}
+
+
+def benchmark_map_reduce(copies: int = 40):
+    with open(os.path.join(DATA_DIR, "economics.txt"), encoding="utf-8") as f:
+        text = "\n\n".join([f.read()] * copies)
+    tokens = token_budget.count_tokens(text, tool_summarize_text.MODEL)
+    separator(f"Summarizing ~{tokens} tokens (server num_ctx {SERVER.num_ctx}, 4 parallel)")
+
+    before = dict(SERVER.stats)
+    tool_summarize_text._chat_summary(text)
+    delta = server_stats_delta(before)
+    print(f"single call         : {delta['prompt_tokens']} of ~{tokens} tokens evaluated "
+          f"({delta['truncated_requests']} truncated request)")
+
+    for concurrency in (1, 4):
+        before = dict(SERVER.stats)
+        result = tool_summarize_text.summarize_long_text(text, max_concurrency=concurrency)
+        delta = server_stats_delta(before)
+        levels = ", ".join(
+            f"L{level['level']} {level['calls']} calls {level['seconds']:.2f}s" for level in result["levels"]
+        )
+        print(f"map-reduce, {concurrency} at once: {result['seconds']:5.2f} sec, {delta['prompt_tokens']} tokens "
+              f"evaluated, {delta['truncated_requests']} truncated ({levels})")
+
+
+def check_stream(name: str, stream_fn, blocking_fn):
+    """Time a streamed call and check that its pieces join to the blocking result from the server"""
+    stats = {}
+    start = time.perf_counter()
+    pieces = list(stream_fn(stats))
+    streamed = time.perf_counter() - start
+    before = dict(SERVER.stats)
+    blocking = blocking_fn()
+    if not server_stats_delta(before)["requests"]:
+        raise AssertionError(f"{name}: the blocking call was answered without the server")
+    if "".join(pieces) != blocking:
+        raise AssertionError(f"{name}: streamed text differs from the blocking result")
+    print(f"{name:<24}: first token after {stats['ttft'] * 1000:5.0f} ms of {streamed * 1000:5.0f} ms, "
+          f"{len(pieces)} pieces, {stats['tokens']} tokens, {stats['tokens_per_sec']:.0f} tokens/sec")
+
+
+def benchmark_streaming():
+    separator("Streaming (NDJSON from /api/chat, SSE from /v1)")
+    with open(os.path.join(DATA_DIR, "economics.txt"), encoding="utf-8") as f:
+        text = f.read()
+
+    def summarize_uncached():
+        with tool_summarize_text.bypass_summary_cache():
+            return tool_summarize_text.summarize_text(text)
+
+    check_stream(
+        "summarize_text_stream",
+        lambda stats: tool_summarize_text.summarize_text_stream(text, stats=stats, use_cache=False),
+        summarize_uncached,
+    )
+    client = OllamaClient(base_url=SERVER.url + "/v1")
+    check_stream(
+        "chat_with_context_stream",
+        lambda stats: client.chat_with_context_stream("Be concise.", text, stats=stats),
+        lambda: client.chat_with_context("Be concise.", text),
+    )
+
+
+def benchmark_summary_cache():
+    separator("Summary cache (memory and shared SQLite tiers)")
+    with open(os.path.join(DATA_DIR, "economics.txt"), encoding="utf-8") as f:
+        text = f.read()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "summaries.db")
+        tool_summarize_text.configure_summary_cache(path)
+        for label in ("cold", "memory hit"):
+            before = dict(SERVER.stats)
+            start = time.perf_counter()
+            tool_summarize_text.summarize_text(text)
+            elapsed = time.perf_counter() - start
+            print(f"{label:<16}: {elapsed * 1000:8.2f} ms, {server_stats_delta(before)['requests']} server requests")
+
+        # a second process shares the SQLite tier
+        before = dict(SERVER.stats)
+        code = ("import time, tool_summarize_text as t; text = open('data/economics.txt').read(); "
+                "start = time.perf_counter(); t.summarize_text(text); print(time.perf_counter() - start)")
+        env = {**os.environ, "SUMMARY_CACHE_PATH": path}
+        elapsed = float(subprocess.run([sys.executable, "-c", code], env=env, check=True,
+                                       capture_output=True, text=True, cwd=os.path.dirname(DATA_DIR)).stdout)
+        print(f"{'other process':<16}: {elapsed * 1000:8.2f} ms, {server_stats_delta(before)['requests']} server requests")
+
+        with tool_summarize_text.bypass_summary_cache():
+            before = dict(SERVER.stats)
+            tool_summarize_text.summarize_text(text)
+            print(f"{'bypassed':<16}: {server_stats_delta(before)['requests']} server requests")
+        stats = tool_summarize_text.summary_cache_stats()
+        stats.pop("tiers")
+        print(f"cache stats     : {stats}")
+        tool_summarize_text.configure_summary_cache()
+
+
+def check_trim_policy():
+    """The "trim" policy must fit every prompt whose trimmable fields are longer than the overflow"""
+    separator("Trim policy at the default num_ctx")
+    with open(os.path.join(DATA_DIR, "economics.txt"), encoding="utf-8") as f:
+        text = f.read()
+    limit = token_budget.context_length(None) - token_budget.DEFAULT_RESERVE_TOKENS
+
+    def build(fields):
+        return [{"role": "system", "content": "Summarize."}, {"role": "user", "content": fields["text"]}]
+
+    sizes = range(limit - 20, 3 * limit, 53)  # token counts around and well past the limit
+    for tokens in sizes:
+        long_text = (text * (tokens // token_budget.count_tokens(text) + 1))[: tokens * 5]
+        messages = token_budget.fit_fields("trim-check", build, {"text": long_text}, ["text"])
+        if token_budget.count_message_tokens(messages, "trim-check") > limit:
+            raise AssertionError(f"trimmed prompt of ~{tokens} tokens still over {limit}")
+
+    long_text = text * 8
+    with contextlib.redirect_stdout(io.StringIO()):  # judge_results prints its reasoning
+        checks = {
+            "evaluate_llm_conversation": "Evaluation failed" not in str(tool_llm_eval.evaluate_llm_conversation(
+                [{"role": "user", "content": "Explain economics."}, {"role": "assistant", "content": long_text}])),
+            "judge_results": tool_judge_results.judge_results("Explain economics.", long_text)["judgement"] != "E",
+            "detect_hallucination": bool(tool_anti_hallucination.detect_hallucination(
+                "Explain economics.", long_text, "Economics studies choices.")),
+        }
+    failed = [name for name, ok in checks.items() if not ok]
+    if failed:
+        raise AssertionError(f"trim policy failed for {', '.join(failed)}")
+    print(f"fit_fields      : {len(sizes)} prompt sizes from {sizes.start} to {sizes.stop} tokens trimmed under {limit}")
+    print(f"tools           : {', '.join(checks)} sent trimmed prompts")
+
+
+def benchmark_token_budget():
+    separator("Token estimates and context-fit policies")
+    with open(os.path.join(DATA_DIR, "economics.txt"), encoding="utf-8") as f:
+        paragraphs = [p for p in f.read().split("\n\n") if p.strip()]
+    model = tool_summarize_text.MODEL
+    samples = []
+    for paragraph in paragraphs:
+        response = ollama_client.chat(model=model, messages=[{"role": "user", "content": paragraph}])
+        samples.append((paragraph, response["prompt_eval_count"]))
+    estimated = sum(token_budget.count_tokens(text, model) for text, _ in samples)
+    actual = sum(tokens for _, tokens in samples)
+    factor = token_budget.calibrate(model, samples)
+    calibrated = sum(token_budget.count_tokens(text, model) for text, _ in samples)
+    print(f"calibration     : server counted {actual} tokens, estimate {estimated} -> {calibrated} "
+          f"after calibration (factor {factor:.2f})")
+
+    token_budget.set_context_length(tool_judge_results.MODEL, 1024)
+    long_output = " ".join(paragraphs) * 3
+    for policy in ("trim", "raise"):
+        tool_judge_results.TOKEN_POLICY = policy
+        before = dict(SERVER.stats)
+        result = tool_judge_results.judge_results("Summarize the economics notes.", long_output)
+        delta = server_stats_delta(before)
+        outcome = result["reasoning"][:60] if result["judgement"] == "E" else f"judgement {result['judgement']}"
+        print(f"judge, {policy:<5}   : {delta['requests']} request, {delta['truncated_requests']} truncated "
+              f"by the server, {outcome}")
+    tool_judge_results.TOKEN_POLICY = "trim"
+    for model_name, stats in token_budget.prompt_token_stats().items():
+        print(f"{model_name:<16}: {stats}")
+
+
+def benchmark_warm_up(load_seconds: float = 1.0, calls: int = 3):
+    """First-call latency with and without warm_up, on a server that takes load_seconds to load a model"""
+    separator(f"Model warm-up and keep_alive (model load {load_seconds:.1f}s, 2 loaded at most)")
+    server = start_fake_server(load_seconds=load_seconds, max_loaded_models=2)
+    ollama_client.configure(host=server.url)
+    models = [tool_summarize_text.MODEL, tool_judge_results.MODEL]
+    messages = [{"role": "user", "content": "Reply with one word."}]
+
+    def timed_calls(model: str):
+        times = []
+        for _ in range(calls):
+            start = time.perf_counter()
+            ollama_client.chat(model=model, messages=messages)
+            times.append((time.perf_counter() - start) * 1000)
+        return ", ".join(f"{ms:6.0f}" for ms in times)
+
+    try:
+        for model in models:
+            print(f"cold, {model:<18}: {timed_calls(model)} ms")
+        ollama_client.generate(models[0], keep_alive=0)  # unload both
+        ollama_client.generate(models[1], keep_alive=0)
+        print(f"warm_up                 : " + ", ".join(
+            f"{model} {seconds:.2f}s" for model, seconds in ollama_client.warm_up(models).items())
+            + " (sent together, loaded one at a time by the server)")
+        for model in models:
+            print(f"warm, {model:<18}: {timed_calls(model)} ms")
+        ollama_client.set_keep_alive(models[0], 0)
+        print(f"keep_alive 0            : {timed_calls(models[0])} ms")
+        ollama_client.set_keep_alive(models[0], "30m")
+        loaded = [model["name"] for model in ollama_client.get_client().ps()["models"]]
+        print(f"loaded models           : {loaded}, server stats loads {server.stats['loads']} "
+              f"unloads {server.stats['unloads']}")
+    finally:
+        ollama_client.configure(host=SERVER.url)
+        server.shutdown()
+
+
+def benchmark_scheduler(load_seconds: float = 0.2, requests_per_caller: int = 8):
+    """Interleaved callers on three models, with and without the model-affinity scheduler"""
+    separator(f"Model scheduler (model load {load_seconds:.1f}s, 1 model loaded at a time)")
+    callers = [  # (caller, model, priority)
+        ("summarize", tool_summarize_text.MODEL, 0),
+        ("judge", tool_judge_results.MODEL, 0),
+        ("llm_eval", "llama3.1", 0),
+        ("interactive", tool_summarize_text.MODEL, -1),
+    ]
+
+    def run_caller(caller: str, model: str, priority: int):
+        # each caller fans out its requests, like the map step of summarize_long_text
+        def one(i: int):
+            ollama_client.chat(model=model, messages=[{"role": "user", "content": f"{caller} request {i}"}],
+                               priority=priority, caller=caller)
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            list(pool.map(one, range(requests_per_caller)))
+
+    for label, enabled in (("no scheduler", False), ("scheduler", True)):
+        server = start_fake_server(load_seconds=load_seconds, max_loaded_models=1, parallel=4)
+        ollama_client.configure(host=server.url)
+        ollama_client.configure_scheduler(enabled=enabled, max_models=1, per_model=4)
+        try:
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=len(callers)) as pool:
+                list(pool.map(lambda args: run_caller(*args), callers))
+            elapsed = time.perf_counter() - start
+            print(f"{label:<13}: {elapsed:5.2f} sec for {server.stats['requests']} requests, "
+                  f"{server.stats['loads']} model loads on the server")
+            stats = ollama_client.scheduler_stats()
+            if stats:
+                print(f"{'':<13}  {stats['model_switches']} model switches, queue wait mean "
+                      f"{stats['mean_wait_seconds'] * 1000:.0f} ms, max {stats['max_wait_seconds'] * 1000:.0f} ms")
+                for caller, entry in stats["callers"].items():
+                    print(f"{'':<13}  {caller:<12} mean wait {entry['wait_seconds'] / entry['requests'] * 1000:5.0f} ms")
+        finally:
+            server.shutdown()
+    ollama_client.configure(host=SERVER.url)
+    ollama_client.configure_scheduler()
+
+
+def benchmark_prompt_layout(calls: int = 10):
+    """Prompt tokens the server evaluates for a batch of checks with each prompt layout"""
+    separator(f"Prompt layout and the server's prefix (KV) cache, {calls} calls per tool")
+    with open(os.path.join(DATA_DIR, "economics.txt"), encoding="utf-8") as f:
+        paragraphs = [p for p in f.read().split("\n\n") if p.strip()]
+    question = "What does the text say about economics?"
+    batches = [
+        ("detect_hallucination", lambda i: tool_anti_hallucination.detect_hallucination(
+            question, paragraphs[i % len(paragraphs)], f"Answer {i}: {paragraphs[(i + 1) % len(paragraphs)][:200]}")),
+        ("judge_results", lambda i: tool_judge_results.judge_results(
+            question, f"Answer {i}: {paragraphs[i % len(paragraphs)]}")),
+    ]
+    for name, call in batches:
+        for layout in ("inline", "prefix"):
+            tool_anti_hallucination.PROMPT_LAYOUT = tool_judge_results.PROMPT_LAYOUT = layout
+            before = dict(SERVER.stats)
+            with contextlib.redirect_stdout(io.StringIO()):  # judge_results prints its reasoning
+                for i in range(calls):
+                    call(i)
+            delta = server_stats_delta(before)
+            print(f"{name:<20} {layout:<6}: prompt_eval_count {delta['prompt_tokens']:5d} "
+                  f"({delta['cached_prompt_tokens']:5d} reused from cache), "
+                  f"prompt_eval_duration {delta['prompt_eval_seconds'] * 1000:6.1f} ms")
+    tool_anti_hallucination.PROMPT_LAYOUT = tool_judge_results.PROMPT_LAYOUT = "prefix"
+
+
+def main():
+    try:
+        with tool_summarize_text.bypass_summary_cache():  # measure real calls
+            benchmark_map_reduce()
+            benchmark_streaming()
+        benchmark_summary_cache()
+        check_trim_policy()
+        benchmark_token_budget()
+        benchmark_prompt_layout()
+        benchmark_warm_up()
+        benchmark_scheduler()
+    finally:
+        SERVER.shutdown()
+
+
+if __name__ == "__main__":
+    main()
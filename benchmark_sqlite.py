@@ -0,0 +1,141 @@
+"""
+Benchmarks for SQLiteTool
+
+Run with:
+
+    python benchmark_sqlite.py
+"""
+
+import asyncio
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from tool_sqlite import AsyncSQLiteTool, DatabaseError, SQLiteTool
+
+
+def separator(title: str):
+    """Prints a section separator"""
+    print(f"\n{'=' * 50}")
+    print(f" {title}")
+    print('=' * 50)
+
+
+def make_tool(db_path: str, **kwargs) -> SQLiteTool:
+    """SQLiteTool is a singleton: drop the previous instance so each run gets its own settings"""
+    SQLiteTool._instance = None
+    return SQLiteTool(db_path, **kwargs)
+
+
+def populate(tool: SQLiteTool, rows: int = 20000):
+    tool.bulk_insert("products", ("product_name", "price"),
+                     ((f"Product {i}", i * 0.25) for i in range(rows)))
+
+
+def queries_per_second(tool: SQLiteTool, callers: int, queries_per_caller: int) -> float:
+    def worker(n):
+        for i in range(queries_per_caller):
+            tool.execute_query(f"SELECT product_name, price FROM products WHERE id = {(n * 7919 + i) % 20000 + 1}")
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=callers) as pool:
+        list(pool.map(worker, range(callers)))
+    elapsed = time.perf_counter() - start
+    return callers * queries_per_caller / elapsed
+
+
+def benchmark_connection_modes(db_path: str, callers: int = 32, queries_per_caller: int = 200):
+    separator(f"Connection modes ({callers} concurrent callers)")
+    per_call = make_tool(db_path)
+    populate(per_call)
+    print(f"connect per call : {queries_per_second(per_call, callers, queries_per_caller):10.0f} queries/sec")
+
+    pooled = make_tool(db_path, pooled=True, pool_size=8)
+    print(f"pooled (WAL)     : {queries_per_second(pooled, callers, queries_per_caller):10.0f} queries/sec")
+    pooled.close_pool()
+
+
+def benchmark_result_cache(db_path: str, repeats: int = 2000, distinct_queries: int = 20):
+    separator(f"Result cache ({repeats} reads of {distinct_queries} distinct queries)")
+    queries = [
+        f"SELECT product_name, price FROM products WHERE price > {i * 100} ORDER BY price DESC LIMIT 50"
+        for i in range(distinct_queries)
+    ]
+
+    def run(tool: SQLiteTool) -> float:
+        start = time.perf_counter()
+        for i in range(repeats):
+            tool.execute_query(queries[i % distinct_queries])
+            if i % 500 == 499:  # occasional write invalidates the cache
+                with tool.get_connection() as conn:
+                    conn.execute("UPDATE products SET price = price + 0.01 WHERE id = 1")
+                    conn.commit()
+        return repeats / (time.perf_counter() - start)
+
+    uncached = run(make_tool(db_path, pooled=True))
+    cached_tool = make_tool(db_path, pooled=True, result_cache_entries=256)
+    cached = run(cached_tool)
+    print(f"no result cache  : {uncached:10.0f} queries/sec")
+    print(f"result cache     : {cached:10.0f} queries/sec ({cached / uncached:.1f}x)")
+    print(f"cache stats      : {cached_tool.result_cache_stats()}")
+
+
+def benchmark_bulk_load(db_path: str, rows: int = 50000):
+    separator(f"Loading {rows} rows")
+    tool = make_tool(db_path)
+    start = time.perf_counter()
+    with tool.get_connection() as conn:
+        for i in range(rows // 10):  # row at a time, one transaction per row
+            conn.execute("INSERT INTO example (name, value) VALUES (?, ?)", (f"Row {i}", float(i)))
+            conn.commit()
+    row_rate = rows // 10 / (time.perf_counter() - start)
+    print(f"row at a time    : {row_rate:10.0f} rows/sec")
+
+    csv_path = os.path.join(os.path.dirname(db_path), "example.csv")
+    with open(csv_path, "w", encoding="utf-8") as f:
+        f.write("name,value\n")
+        for i in range(rows):
+            f.write(f"Row {i},{i * 1.5}\n")
+    stats = tool.load_csv(csv_path, "example")
+    print(f"load_csv         : {stats['rows_per_sec']:10.0f} rows/sec ({stats['rows']} rows)")
+
+
+def benchmark_async(db_path: str, coroutines: int = 200, queries_per_coroutine: int = 25):
+    separator(f"AsyncSQLiteTool ({coroutines} concurrent coroutines)")
+    tool = AsyncSQLiteTool(make_tool(db_path, pooled=True), read_connections=4)
+
+    async def client(n: int):
+        for i in range(queries_per_coroutine):
+            await tool.aexecute_query(
+                f"SELECT product_name, price FROM products WHERE id = {(n * 7919 + i) % 20000 + 1}")
+
+    async def run() -> float:
+        start = time.perf_counter()
+        await asyncio.gather(*(client(n) for n in range(coroutines)))
+        return coroutines * queries_per_coroutine / (time.perf_counter() - start)
+
+    async def slow_query(timeout: float):
+        slow = "WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c) SELECT count(*) FROM c"
+        start = time.perf_counter()
+        try:
+            await tool.aexecute_query(slow, timeout=timeout)
+        except DatabaseError as e:
+            print(f"slow query       : {e} after {time.perf_counter() - start:.2f} sec")
+
+    print(f"aexecute_query   : {asyncio.run(run()):10.0f} queries/sec")
+    asyncio.run(slow_query(0.25))
+    tool.close()
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        benchmark_connection_modes(db_path)
+        benchmark_result_cache(db_path)
+        benchmark_bulk_load(db_path)
+        benchmark_async(db_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Startup benchmark for the example entry points
+
+Each example runs its LLM calls at the top level, so instead of importing it
+this collects the example's top-level import statements and times them in a
+fresh interpreter with `python -X importtime`. Imports of this repository's
+tool modules are timed separately, since they should stay cheap no matter
+what the example itself pulls in.
+
+Run with:
+
+    python benchmark_startup.py [--budget-ms 100]
+
+The exit status is 1 when the tool imports of any entry point take longer
+than the budget, so the script can be used to catch startup regressions.
+"""
+
+import argparse
+import ast
+import os
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+ENTRY_POINTS = [
+    "example_chain_web_summary.py",
+    "example_chain_read_summary.py",
+    "ollama_tools_examples.py",
+    "example_judge.py",
+    "example_judge2.py",
+]
+
+
+def separator(title: str):
+    """Prints a section separator"""
+    print(f"\n{'=' * 50}")
+    print(f" {title}")
+    print('=' * 50)
+
+
+def top_level_imports(path: str) -> List[Tuple[str, str]]:
+    """(module name, import statement source) for each top-level import in a script"""
+    with open(path, encoding="utf-8") as f:
+        source = f.read()
+    imports = []
+    for node in ast.parse(source).body:
+        if isinstance(node, ast.Import):
+            imports.extend((alias.name, f"import {alias.name}") for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            imports.append((node.module, ast.get_source_segment(source, node)))
+    return imports
+
+
+def is_local(module: str) -> bool:
+    return os.path.isfile(os.path.join(REPO_DIR, module.split(".")[0] + ".py"))
+
+
+def _run_importtime(statements: List[str]) -> Tuple[Dict[str, float], subprocess.CompletedProcess]:
+    """Cumulative ms of each top-level module imported while running the statements"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "\n".join(statements)],
+        cwd=REPO_DIR, capture_output=True, text=True,
+    )
+    timings = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit() and not name.startswith("  "):  # top-level modules only
+            timings[name.strip()] = int(cumulative) / 1000
+    return timings, proc
+
+
+# modules the interpreter imports before running any code (site, encodings, ...)
+_STARTUP_MODULES = set(_run_importtime([])[0])
+
+
+def import_time(statements: List[str], repeats: int = 3) -> Tuple[float, Dict[str, float], str]:
+    """
+    Best-of-repeats time in ms spent importing modules for the statements in a
+    fresh interpreter, with the cumulative ms of each top-level module and any error
+    """
+    best, modules, error = None, {}, ""
+    for _ in range(repeats):
+        timings, proc = _run_importtime(statements)
+        timings = {name: ms for name, ms in timings.items() if name not in _STARTUP_MODULES}
+        total = sum(timings.values())
+        if proc.returncode != 0:
+            error = proc.stderr.strip().splitlines()[-1]
+        if best is None or total < best:
+            best, modules = total, timings
+    return best, modules, error
+
+
+def benchmark_entry_point(script: str, budget_ms: float) -> bool:
+    imports = top_level_imports(os.path.join(REPO_DIR, script))
+    tools = [statement for module, statement in imports if is_local(module)]
+    total, modules, error = import_time([statement for _, statement in imports])
+    tools_total, _, tools_error = import_time(tools)
+    heaviest = sorted(modules.items(), key=lambda item: -item[1])[:3]
+    within_budget = tools_total <= budget_ms
+    print(f"{script:<30}: {total:7.1f} ms all imports, {tools_total:6.1f} ms tool imports"
+          f"{'' if within_budget else '  OVER BUDGET'}")
+    print(f"{'':<30}  heaviest: {', '.join(f'{name} {ms:.0f} ms' for name, ms in heaviest)}")
+    for message in {error, tools_error} - {""}:
+        print(f"{'':<30}  error: {message}")
+    return within_budget
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--budget-ms", type=float, default=100.0,
+                        help="maximum time to import the tool modules of one entry point")
+    args = parser.parse_args()
+    separator(f"Import time per entry point (tool budget {args.budget_ms:.0f} ms)")
+    results = [benchmark_entry_point(script, args.budget_ms) for script in ENTRY_POINTS]
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,355 @@
+"""
+Benchmarks for the web tools, run against a local stub HTTP server
+
+Run with:
+
+    python benchmark_web_search.py
+"""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from http.server import BaseHTTPRequestHandler, SimpleHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+import html_markdown
+import http_client
+import site_crawler
+import tool_web_search
+
+logging.getLogger().setLevel(logging.WARNING)  # uri_to_markdown logs every page at INFO
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "html_corpus")
+
+PAGE = (
+    "<html><head><title>Stub page</title></head><body>"
+    + "<p>Some paragraph text for the benchmark.</p>" * 200
+    + "</body></html>"
+).encode("utf-8")
+
+BRAVE_LATENCY = 0.2  # seconds, roughly a real search API round trip
+
+
+def separator(title: str):
+    """Prints a section separator"""
+    print(f"\n{'=' * 50}")
+    print(f" {title}")
+    print('=' * 50)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Serves PAGE with keep-alive; /flaky fails with 503 on every other request,
+    /etag answers conditional requests with 304, /site/<name> serves the
+    fixture corpus, /large/<n> a large article page and /brave a fake Brave
+    search API that answers after BRAVE_LATENCY seconds
+    """
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # headers and body are separate writes on a kept-alive socket
+    flaky_count = 0
+    brave_calls = 0
+
+    def send_body(self, body: bytes, status: int = 200):
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.startswith("/brave"):
+            StubHandler.brave_calls += 1
+            time.sleep(BRAVE_LATENCY)
+            query = parse_qs(urlparse(self.path).query)
+            count = int(query.get("count", ["3"])[0])
+            results = [
+                {"title": f"Result {i}", "url": f"https://example.com/{i}",
+                 "description": f"<strong>{query['q'][0]}</strong> result {i}"}
+                for i in range(count)
+            ]
+            body = json.dumps({"web": {"results": results}}).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("X-RateLimit-Remaining", f"1, {2000 - StubHandler.brave_calls}")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        if self.path.startswith("/site/"):
+            path = os.path.join(CORPUS_DIR, os.path.basename(self.path.split("?")[0].split("#")[0]))
+            if os.path.isfile(path):
+                with open(path, "rb") as f:
+                    self.send_body(f.read())
+            else:
+                self.send_body(b"<html><body>Not found</body></html>", 404)
+            return
+        if self.path.startswith("/large"):
+            self.send_body(LARGE_PAGE)
+            return
+        if self.path.startswith("/flaky"):
+            StubHandler.flaky_count += 1
+            if StubHandler.flaky_count % 2:
+                self.send_response(503)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+        if self.path.startswith("/etag"):
+            if self.headers.get("If-None-Match") == '"v1"':
+                self.send_response(304)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+        self.send_response(200)
+        self.send_header("ETag", '"v1"')
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(PAGE)))
+        self.end_headers()
+        self.wfile.write(PAGE)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(handler=StubHandler) -> ThreadingHTTPServer:
+    """Start a stub server on a free local port in a background thread"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def pages_per_second(get, url: str, pages: int, workers: int) -> float:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(lambda _: get(url).content, range(pages)))
+    return pages / (time.perf_counter() - start)
+
+
+def benchmark_http_client(base_url: str, pages: int = 2000, workers: int = 8):
+    separator(f"Fetching {pages} pages with {workers} threads")
+    per_call = pages_per_second(lambda url: requests.get(url, timeout=10), base_url + "/page", pages, workers)
+    print(f"requests.get     : {per_call:10.0f} pages/sec")
+    pooled = pages_per_second(http_client.http_get, base_url + "/page", pages, workers)
+    print(f"http_get (pooled): {pooled:10.0f} pages/sec ({pooled / per_call:.1f}x)")
+
+    http_client.configure(backoff_factor=0.01)
+    statuses = [http_client.http_get(base_url + "/flaky").status_code for _ in range(5)]
+    print(f"flaky endpoint   : statuses after retries {statuses}")
+
+
+def benchmark_page_cache(base_url: str, fetches: int = 300):
+    separator(f"uri_to_markdown, {fetches} fetches of one URL")
+    url = base_url + "/etag"
+
+    def run() -> float:
+        start = time.perf_counter()
+        for _ in range(fetches):
+            tool_web_search.uri_to_markdown(url)
+        return fetches / (time.perf_counter() - start)
+
+    print(f"no cache         : {run():10.0f} pages/sec")
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = tool_web_search.enable_page_cache(os.path.join(tmp, "web_cache.db"), ttl=0)
+        print(f"revalidate (304) : {run():10.0f} pages/sec")
+        cache.ttl = 3600
+        print(f"within TTL       : {run():10.0f} pages/sec")
+        print(f"cache stats      : {tool_web_search.page_cache_stats()}")
+        tool_web_search._page_cache = None
+
+
+def benchmark_search_cache(base_url: str, agents: int = 16, rounds: int = 5):
+    separator(f"brave_search_summaries, {agents} agents asking the same questions")
+    url = base_url + "/brave"
+    questions = ["Best hiking trails in Arizona", "  best hiking  trails in arizona", "Sedona weather"]
+
+    def run() -> float:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=agents) as pool:
+            for _ in range(rounds):
+                list(pool.map(lambda i: tool_web_search.brave_search_summaries(
+                    questions[i % len(questions)], url=url, api_key="benchmark"), range(agents)))
+        return time.perf_counter() - start
+
+    calls = StubHandler.brave_calls
+    tool_web_search.configure_search_cache(ttl=0)
+    elapsed = run()
+    print(f"coalescing only  : {elapsed:6.2f} sec, {StubHandler.brave_calls - calls} API calls")
+    calls = StubHandler.brave_calls
+    tool_web_search.configure_search_cache(ttl=600)
+    elapsed = run()
+    print(f"TTL cache        : {elapsed:6.2f} sec, {StubHandler.brave_calls - calls} API calls "
+          f"({agents * rounds} without cache or coalescing)")
+    print(f"cache stats      : {tool_web_search.search_cache_stats()}")
+
+
+def large_page(repeats: int = 200) -> str:
+    """The fixture article with its body repeated, as a large single document"""
+    with open(os.path.join(CORPUS_DIR, "article.html"), encoding="utf-8") as f:
+        article = f.read()
+    start, end = article.index("<article>"), article.index("</article>") + len("</article>")
+    return article[:start] + article[start:end] * repeats + article[end:]
+
+
+LARGE_PAGE = large_page().encode("utf-8")
+
+
+def load_corpus() -> dict:
+    """Saved HTML pages used by the extraction benchmarks: file name -> HTML text"""
+    corpus = {}
+    for name in sorted(os.listdir(CORPUS_DIR)):
+        if name.endswith(".html"):
+            with open(os.path.join(CORPUS_DIR, name), encoding="utf-8") as f:
+                corpus[name] = f.read()
+    return corpus
+
+
+def benchmark_html_engines(repeats: int = 20):
+    # one large page as well, since per-call overhead dominates small pages
+    pages = list(load_corpus().values()) + [large_page()]
+    total_bytes = sum(len(page.encode("utf-8")) for page in pages) * repeats
+    separator(f"HTML to markdown, {total_bytes / 1e6:.1f} MB per engine")
+    for engine in html_markdown.available_engines():
+        start = time.perf_counter()
+        for _ in range(repeats):
+            for page in pages:
+                html_markdown.convert_html(page, engine)
+        elapsed = time.perf_counter() - start
+        print(f"{engine:<17}: {total_bytes / 1e6 / elapsed:10.1f} MB/sec")
+
+
+def benchmark_main_content():
+    separator("Main-content extraction on the fixture corpus")
+    with open(os.path.join(CORPUS_DIR, "expected.json"), encoding="utf-8") as f:
+        expected = json.load(f)
+    kept_total = dropped_total = keep_total = drop_total = 0
+    for name, page_html in load_corpus().items():
+        page = html_markdown.convert_html(page_html, main_content=True)
+        stats = page["stats"]
+        keep = expected.get(name, {}).get("keep", [])
+        drop = expected.get(name, {}).get("drop", [])
+        kept = sum(snippet in page["markdown"] for snippet in keep)
+        dropped = sum(snippet not in page["markdown"] for snippet in drop)
+        kept_total, keep_total = kept_total + kept, keep_total + len(keep)
+        dropped_total, drop_total = dropped_total + dropped, drop_total + len(drop)
+        print(f"{name:<13}: {stats['chars_in']:6} -> {stats['chars_out']:6} chars, "
+              f"~{stats['tokens_saved_estimate']:4} tokens saved, "
+              f"kept {kept}/{len(keep)} content snippets, dropped {dropped}/{len(drop)} boilerplate")
+    print(f"content recall {kept_total / keep_total:.0%}, boilerplate removed {dropped_total / drop_total:.0%}")
+
+
+def benchmark_bulk_conversion(base_url: str, pages: int = 64):
+    cpus = os.cpu_count() or 1
+    separator(f"uris_to_markdown, {pages} large pages ({cpus} CPUs)")
+    uris = [f"{base_url}/large/{i}" for i in range(pages)]
+    for workers in sorted({0, 1, 2, cpus}):
+        start = time.perf_counter()
+        errors = sum(item["error"] is not None for item in tool_web_search.uris_to_markdown(uris, workers=workers))
+        rate = pages / (time.perf_counter() - start)
+        label = "threads only" if workers == 0 else f"{workers} processes"
+        print(f"{label:<17}: {rate:10.1f} pages/sec ({errors} errors)")
+
+
+class StaticSiteHandler(SimpleHTTPRequestHandler):
+    """Serves a directory of static files with keep-alive, after a simulated network latency"""
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    latency = 0.02  # seconds
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        super().do_GET()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def write_static_site(directory: str, pages: int) -> str:
+    """
+    Write a documentation-like site of article pages: page i links to pages
+    2i+1 and 2i+2 (a binary tree of depth ~log2(pages)), back to index.html,
+    with tracking parameters and fragments, and to a print copy with the same
+    content. Returns the seed page name.
+    """
+    corpus = load_corpus()
+    for name, page_html in corpus.items():  # the article links to the other fixture pages
+        with open(os.path.join(directory, name), "w", encoding="utf-8") as f:
+            f.write(page_html)
+    article = corpus["article.html"]
+    for i in range(pages):
+        children = "".join(
+            f'<li><a href="page{c}.html">Page {c}</a> <a href="page{c}.html?utm_source=nav#top">again</a></li>'
+            for c in (2 * i + 1, 2 * i + 2) if c < pages
+        )
+        nav = f'<ul><li><a href="index.html">Home</a></li>{children}<li><a href="print{i}.html">Print</a></li></ul>'
+        intro = f"<p>This is page {i} of the generated test site.</p>"
+        body = article.replace("<article>", f"<article><h1>Page {i}</h1>{intro}{nav}", 1)
+        name = "index.html" if i == 0 else f"page{i}.html"
+        for file_name in (name, f"print{i}.html"):
+            with open(os.path.join(directory, file_name), "w", encoding="utf-8") as f:
+                f.write(body)
+    return "index.html"
+
+
+def benchmark_crawler(pages: int = 200):
+    latency_ms = StaticSiteHandler.latency * 1000
+    separator(f"Crawling a static site of {pages} pages + {pages} duplicates, {latency_ms:.0f} ms latency")
+    with tempfile.TemporaryDirectory() as tmp:
+        site = os.path.join(tmp, "site")
+        os.mkdir(site)
+        seed = write_static_site(site, pages)
+        server = start_server(partial(StaticSiteHandler, directory=site))
+        seed_url = f"http://127.0.0.1:{server.server_address[1]}/{seed}"
+        try:
+            # baseline: uri_to_markdown in a loop over the same pages
+            urls = [seed_url] + [seed_url.replace(seed, f"page{i}.html") for i in range(1, pages)]
+            start = time.perf_counter()
+            for url in urls:
+                tool_web_search.uri_to_markdown(url)
+            print(f"uri_to_markdown loop : {pages / (time.perf_counter() - start):8.1f} pages/sec")
+
+            output = os.path.join(tmp, "site.jsonl")
+            settings = dict(max_depth=20, max_pages=2 * pages + 10, delay=0)
+            for concurrency in (1, 8):
+                stats = site_crawler.crawl_site(seed_url, output, concurrency=concurrency,
+                                                per_host_limit=concurrency, **settings)
+                print(f"crawler, {concurrency} at once  : {stats['pages_per_sec']:8.1f} pages/sec, "
+                      f"{stats['written']} written, {stats['duplicates']} duplicates, {stats['errors']} errors")
+
+            # resume: stop after half the budget, then continue with the full budget
+            half = {**settings, "max_pages": pages}
+            first = site_crawler.crawl_site(seed_url, output, concurrency=8, per_host_limit=8, **half)
+            second = site_crawler.crawl_site(seed_url, output, resume=True, concurrency=8,
+                                             per_host_limit=8, **settings)
+            with open(output, encoding="utf-8") as f:
+                lines = f.readlines()
+            unique = len({json.loads(line)["url"] for line in lines})
+            print(f"resume               : {first['written']} + {second['written']} pages written, "
+                  f"{len(lines)} lines, {unique} unique URLs")
+        finally:
+            server.shutdown()
+
+
+def main():
+    benchmark_html_engines()
+    benchmark_main_content()
+    server = start_server()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        benchmark_http_client(base_url)
+        benchmark_page_cache(base_url)
+        benchmark_search_cache(base_url)
+        benchmark_bulk_conversion(base_url)
+        benchmark_crawler()
+    finally:
+        server.shutdown()
+        http_client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,375 @@
+"""
+Fake Ollama server for benchmarks and tests
+
+Answers /api/chat and /api/generate like an Ollama server, without a model,
+streaming chunked NDJSON when the request asks for it, and the OpenAI
+compatible /v1/chat/completions endpoint with server-sent events. The reply
+is built from the prompt, and the server sleeps for as long as a real server
+would need to evaluate the prompt and generate each token at the configured
+speeds. Like Ollama it evaluates at most `parallel` requests at once, and it
+silently truncates prompts longer than num_ctx tokens.
+
+With load_seconds set, the first request for a model also waits for the model
+to load, one load at a time. A model stays loaded for the request's keep_alive
+(default 5 minutes) and at most max_loaded_models are loaded at once; a
+generate request without a prompt only loads the model. /api/ps lists the
+loaded models.
+
+Like Ollama, each of the `parallel` slots keeps the KV cache of its last
+prompt: a request whose prompt starts with the same text as a cached prompt
+for the same model evaluates only the rest, and prompt_eval_count and
+prompt_eval_duration count only the newly evaluated tokens.
+
+Point the ollama library at it with the OLLAMA_HOST environment variable
+(read when ollama is first imported) or ollama.Client(host=server.url).
+
+Run with:
+
+    python fake_ollama_server.py --port 11435
+"""
+
+import argparse
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, Optional, Tuple, Union
+
+DEFAULT_KEEP_ALIVE = 300.0  # Ollama's default of 5 minutes
+_DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def parse_keep_alive(value: Union[None, float, str]) -> Optional[float]:
+    """
+    Seconds to keep a model loaded for an Ollama keep_alive value: a number
+    of seconds or a duration such as "30m" or "1h30m"; None means forever
+    """
+    if value is None or value == "":
+        return DEFAULT_KEEP_ALIVE
+    if isinstance(value, str):
+        try:
+            value = float(value)
+        except ValueError:
+            parts = re.findall(r"(-?[\d.]+)(ms|s|m|h)", value)
+            if not parts:
+                raise ValueError(f"invalid keep_alive: {value}")
+            value = sum(float(number) * _DURATION_UNITS[unit] for number, unit in parts)
+    return None if value < 0 else float(value)
+
+
+def _count_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _event(data: Dict[str, Any]) -> bytes:
+    return b"data: " + json.dumps(data).encode("utf-8") + b"\n\n"
+
+
+def _usage(timings: Dict[str, Any]) -> Dict[str, int]:
+    return {
+        "prompt_tokens": timings["prompt_eval_count"],
+        "completion_tokens": timings["eval_count"],
+        "total_tokens": timings["prompt_eval_count"] + timings["eval_count"],
+    }
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def send_json(self, data: Dict[str, Any], status: int = 200):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/api/version":
+            self.send_json({"version": "0.0.0-fake"})
+        elif self.path == "/api/tags":
+            self.send_json({"models": []})
+        elif self.path == "/api/ps":
+            self.send_json({"models": self.server.loaded_models()})
+        else:
+            self.send_json({"error": "not found"}, 404)
+
+    def send_chunked(self, content_type: str, chunks: Iterator[bytes]):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for chunk in chunks:
+            self.wfile.write(f"{len(chunk):x}\r\n".encode("ascii") + chunk + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        model = request.get("model")
+        if self.path == "/api/generate" and not request.get("prompt"):
+            # an empty prompt loads (or with keep_alive 0 unloads) the model
+            load_seconds = self.server.load(model, request.get("keep_alive"))
+            self.send_json({"model": model, "created_at": _now(), "response": "", "done": True,
+                            "done_reason": "unload" if parse_keep_alive(request.get("keep_alive")) == 0 else "load",
+                            "load_duration": int(load_seconds * 1e9)})
+        elif self.path == "/api/chat":
+            prompt = "\n".join(message.get("content", "") for message in request.get("messages", []))
+            self.send_ollama(request, prompt, lambda piece: {"message": {"role": "assistant", "content": piece}})
+        elif self.path == "/api/generate":
+            prompt = request.get("system", "") + "\n" + request.get("prompt", "")
+            self.send_ollama(request, prompt, lambda piece: {"response": piece})
+        elif self.path == "/v1/chat/completions":
+            prompt = "\n".join(message.get("content", "") for message in request.get("messages", []))
+            if request.get("stream"):
+                self.send_chunked("text/event-stream", self.openai_events(request, prompt))
+            else:
+                reply, timings = self.server.complete(prompt, model, request.get("keep_alive"))
+                self.send_json({
+                    "id": "chatcmpl-fake", "object": "chat.completion", "created": int(time.time()),
+                    "model": model,
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": reply},
+                                 "finish_reason": "stop"}],
+                    "usage": _usage(timings),
+                })
+        else:
+            self.send_json({"error": "not found"}, 404)
+
+    def send_ollama(self, request: Dict[str, Any], prompt: str, content):
+        """Reply as Ollama does: one JSON object, or NDJSON chunks when streaming (the API default)"""
+        base = {"model": request.get("model")}
+        if not request.get("stream", True):
+            reply, timings = self.server.complete(prompt, request.get("model"), request.get("keep_alive"))
+            self.send_json({**timings, **base, **content(reply)})
+            return
+
+        def lines():
+            for piece, timings in self.server.generate(prompt, request.get("model"), request.get("keep_alive")):
+                if timings is None:
+                    chunk = {**base, "created_at": _now(), **content(piece), "done": False}
+                else:
+                    chunk = {**timings, **base, **content("")}
+                yield json.dumps(chunk).encode("utf-8") + b"\n"
+
+        self.send_chunked("application/x-ndjson", lines())
+
+    def openai_events(self, request: Dict[str, Any], prompt: str) -> Iterator[bytes]:
+        base = {"id": "chatcmpl-fake", "object": "chat.completion.chunk",
+                "created": int(time.time()), "model": request.get("model")}
+        for piece, timings in self.server.generate(prompt, request.get("model"), request.get("keep_alive")):
+            if timings is None:
+                choice = {"index": 0, "delta": {"role": "assistant", "content": piece}, "finish_reason": None}
+                yield _event({**base, "choices": [choice]})
+            else:
+                yield _event({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+                if (request.get("stream_options") or {}).get("include_usage"):
+                    yield _event({**base, "choices": [], "usage": _usage(timings)})
+        yield b"data: [DONE]\n\n"
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeOllamaServer(ThreadingHTTPServer):
+    """
+    Args:
+        port (int): port to listen on, 0 picks a free port
+        prompt_tokens_per_sec (float): simulated prompt evaluation speed
+        tokens_per_sec (float): simulated generation speed
+        output_tokens (int): length of every reply
+        parallel (int): requests evaluated at once, like OLLAMA_NUM_PARALLEL
+        num_ctx (int): context length; longer prompts are truncated
+        load_seconds (float): time to load a model that is not loaded
+        max_loaded_models (int): models kept loaded at once, like OLLAMA_MAX_LOADED_MODELS
+        prefix_cache (bool): reuse the evaluated prefix of earlier prompts
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        port: int = 0,
+        prompt_tokens_per_sec: float = 20000,
+        tokens_per_sec: float = 400,
+        output_tokens: int = 40,
+        parallel: int = 4,
+        num_ctx: int = 4096,
+        load_seconds: float = 0.0,
+        max_loaded_models: int = 3,
+        prefix_cache: bool = True,
+    ):
+        super().__init__(("127.0.0.1", port), FakeOllamaHandler)
+        self.prompt_tokens_per_sec = prompt_tokens_per_sec
+        self.tokens_per_sec = tokens_per_sec
+        self.output_tokens = output_tokens
+        self.num_ctx = num_ctx
+        self._slots = threading.Semaphore(parallel)
+        self.load_seconds = load_seconds
+        self.max_loaded_models = max_loaded_models
+        self.prefix_cache = prefix_cache
+        self._parallel = parallel
+        self._cached_prompts: Dict[Optional[str], list] = {}  # model -> prompts in its slots' KV caches
+        self._loaded: "OrderedDict[str, Optional[float]]" = OrderedDict()  # model -> unload time, None for never
+        self._model_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "prompt_tokens": 0, "truncated_requests": 0, "busy_seconds": 0.0,
+                      "cached_prompt_tokens": 0, "prompt_eval_seconds": 0.0, "loads": 0, "unloads": 0, "load_seconds": 0.0}
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self) -> "FakeOllamaServer":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def _unload(self, model: Optional[str]):
+        del self._loaded[model]
+        self.stats["unloads"] += 1
+        with self._lock:
+            self._cached_prompts.pop(model, None)
+
+    def _expire(self, now: float):
+        for model, until in list(self._loaded.items()):
+            if until is not None and until <= now:
+                self._unload(model)
+
+    def load(self, model: Optional[str], keep_alive: Union[None, float, str] = None) -> float:
+        """
+        Make sure model is loaded, evicting the least recently used model when
+        max_loaded_models are loaded, and keep it for keep_alive; returns the
+        seconds spent loading
+        """
+        seconds = parse_keep_alive(keep_alive)
+        with self._model_lock:  # the scheduler loads one model at a time
+            now = time.monotonic()
+            self._expire(now)
+            waited = 0.0
+            if seconds == 0:
+                if model in self._loaded:
+                    self._unload(model)
+                return waited
+            if model not in self._loaded:
+                while len(self._loaded) >= self.max_loaded_models:
+                    self._unload(next(iter(self._loaded)))
+                time.sleep(self.load_seconds)
+                waited = self.load_seconds
+                self.stats["loads"] += 1
+                self.stats["load_seconds"] += waited
+            self._loaded[model] = None if seconds is None else time.monotonic() + seconds
+            self._loaded.move_to_end(model)
+            return waited
+
+    def loaded_models(self):
+        with self._model_lock:
+            self._expire(time.monotonic())
+            return [
+                {"name": model, "model": model,
+                 "expires_at": "" if until is None else datetime.fromtimestamp(
+                     time.time() + until - time.monotonic(), timezone.utc).isoformat()}
+                for model, until in self._loaded.items()
+            ]
+
+    def _reuse_prefix(self, model: Optional[str], prompt: str, tokens: int) -> int:
+        """
+        Tokens of prompt already in a slot's KV cache; the prompt then takes
+        the slot with the longest match (or the least recently used one)
+        """
+        if not self.prefix_cache:
+            return 0
+        with self._lock:
+            prompts = self._cached_prompts.setdefault(model, [])
+            matches = [len(os.path.commonprefix([cached, prompt])) for cached in prompts]
+            best = max(range(len(matches)), key=matches.__getitem__) if matches else None
+            reused = matches[best] if best is not None else 0
+            if best is not None and (reused or len(prompts) >= self._parallel):
+                del prompts[best if reused else 0]
+            prompts.append(prompt)
+        return min(reused // 4, tokens - 1)  # at least one token is always evaluated
+
+    def generate(
+        self, prompt: str, model: Optional[str] = None, keep_alive: Union[None, float, str] = None
+    ) -> Iterator[Tuple[str, Optional[Dict[str, Any]]]]:
+        """
+        Simulate one completion, yielding (piece, None) as each token is
+        generated and finally ("", Ollama's timing fields)
+        """
+        start = time.perf_counter()
+        unload_after = parse_keep_alive(keep_alive) == 0
+        load_seconds = self.load(model, DEFAULT_KEEP_ALIVE if unload_after else keep_alive)
+        prompt_tokens = _count_tokens(prompt)
+        context_tokens = min(prompt_tokens, self.num_ctx)
+        # a truncated prompt starts part way through, so it cannot match a cached prefix
+        cached = self._reuse_prefix(model, prompt, context_tokens) if context_tokens == prompt_tokens else 0
+        evaluated = context_tokens - cached
+        words = prompt.split()[-(self.output_tokens - 6):]
+        pieces = f"Summary of {prompt_tokens} prompt tokens: {' '.join(words)}".split(" ")
+        prompt_seconds = evaluated / self.prompt_tokens_per_sec
+        with self._slots:
+            time.sleep(prompt_seconds)
+            eval_start = time.perf_counter()
+            for i, piece in enumerate(pieces):
+                time.sleep(1 / self.tokens_per_sec)
+                yield (piece if i == 0 else " " + piece), None
+            eval_seconds = time.perf_counter() - eval_start
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["prompt_tokens"] += evaluated
+            self.stats["truncated_requests"] += context_tokens < prompt_tokens
+            self.stats["cached_prompt_tokens"] += cached
+            self.stats["prompt_eval_seconds"] += prompt_seconds
+            self.stats["busy_seconds"] += prompt_seconds + eval_seconds
+        if unload_after:
+            self.load(model, 0)
+        yield "", {
+            "created_at": _now(),
+            "done": True,
+            "done_reason": "stop",
+            "total_duration": int((time.perf_counter() - start) * 1e9),
+            "load_duration": int(load_seconds * 1e9),
+            "prompt_eval_count": evaluated,
+            "prompt_eval_duration": int(prompt_seconds * 1e9),
+            "eval_count": len(pieces),
+            "eval_duration": int(eval_seconds * 1e9),
+        }
+
+    def complete(
+        self, prompt: str, model: Optional[str] = None, keep_alive: Union[None, float, str] = None
+    ) -> Tuple[str, Dict[str, Any]]:
+        """Simulate one completion; returns the reply and Ollama's timing fields"""
+        pieces = list(self.generate(prompt, model, keep_alive))
+        return "".join(piece for piece, _ in pieces), pieces[-1][1]
+
+
+def start_fake_server(**settings) -> FakeOllamaServer:
+    """Start a FakeOllamaServer (see its arguments) in a background thread"""
+    return FakeOllamaServer(**settings).start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Ollama server for benchmarks")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--parallel", type=int, default=4)
+    parser.add_argument("--load-seconds", type=float, default=0.0)
+    parser.add_argument("--no-prefix-cache", action="store_true")
+    args = parser.parse_args()
+    server = FakeOllamaServer(port=args.port, parallel=args.parallel, load_seconds=args.load_seconds,
+                              prefix_cache=not args.no_prefix_cache)
+    print(f"Fake Ollama server listening on {server.url}")
+    server.serve_forever()
+
+
+# Export the classes
+__all__ = ["FakeOllamaServer", "start_fake_server", "parse_keep_alive"]
+
+if __name__ == "__main__":
+    main()
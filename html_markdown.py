@@ -0,0 +1,501 @@
+"""
+HTML to markdown conversion for the web tools
+
+Every engine feeds the same single-pass markdown writer with start tag, end
+tag and text events. html.parser does not build a tree, so its engine adds the
+end tags that HTML implies (unclosed <td>, <li>, <p> and the like) itself;
+with that the output is the same whichever parser is used, except for badly
+misnested markup that the HTML5 tree builders rearrange:
+
+    lxml         C-backed libxml2 parser (used by default when installed)
+    selectolax   C-backed lexbor/modest parser (used when lxml is missing)
+    html.parser  Python standard library streaming parser (always available)
+    bs4          the original BeautifulSoup get_text() extraction (plain text)
+"""
+
+import html
+import re
+from html.parser import HTMLParser
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urljoin
+
+from token_budget import tokens_for_chars
+
+SKIP_TAGS = {"script", "style", "noscript", "template", "svg", "head", "iframe", "object", "canvas"}
+BLOCK_TAGS = {
+    "p", "div", "section", "article", "main", "header", "footer", "nav", "aside", "form",
+    "table", "blockquote", "figure", "figcaption", "dl", "dt", "dd", "address",
+    "fieldset", "details", "summary", "hr", "body", "html",
+}
+HEADING_TAGS = {"h1": 1, "h2": 2, "h3": 3, "h4": 4, "h5": 5, "h6": 6}
+BOILERPLATE_TAGS = {"nav", "aside", "form", "button", "dialog"}
+PAGE_CHROME_TAGS = {"header", "footer"}  # boilerplate unless inside the article itself
+CONTENT_TAGS = {"article", "main"}
+BOILERPLATE_HINTS = re.compile(
+    r"cookie|consent|gdpr|banner|breadcrumb|sidebar|footer|\bnav|menu|toc\b|newsletter|subscribe|"
+    r"signup|share|social|related|comment|advert|\bads?\b|promo|popup|modal",
+    re.I,
+)
+MARKDOWN_LINK = re.compile(r"\[([^\]]*)\]\([^)]*\)")
+_XML_DECLARATION = re.compile(r"^\s*<\?xml[^>]*\?>")
+VOID_TAGS = {"br", "img", "hr", "meta", "link", "input", "area", "base", "col", "embed", "source", "track", "wbr"}
+
+
+class MarkdownWriter:
+    """Builds markdown from a stream of start / end / text events"""
+
+    def __init__(self, base_url: Optional[str] = None):
+        self.base_url = base_url
+        self.parts: List[str] = []
+        self.flags: List[bool] = []  # parallel to parts: True for parts inside boilerplate elements
+        self.title_parts: List[str] = []
+        self.links: List[str] = []
+        self._skip_depth = 0
+        self._in_title = False
+        self._head_depth = 0
+        self._pre_depth = 0
+        self._lists: List[List[Any]] = []  # [tag, item counter]
+        self._anchors: List[Tuple[int, Optional[str]]] = []  # (index of "[" in parts, href)
+        self._open: List[Tuple[str, bool]] = []  # open elements: (tag, is boilerplate container)
+        self._boilerplate_depth = 0
+        self._content_depth = 0
+
+    def _append(self, text: str):
+        self.parts.append(text)
+        self.flags.append(self._boilerplate_depth > 0)
+
+    def _enter(self, tag: str, attrs: Dict[str, Optional[str]]):
+        """Track whether we are inside navigation, footers, banners and similar page chrome"""
+        hints = f"{attrs.get('class') or ''} {attrs.get('id') or ''}"
+        boilerplate = tag not in CONTENT_TAGS and (
+            tag in BOILERPLATE_TAGS
+            or (tag in PAGE_CHROME_TAGS and not self._content_depth)
+            or bool(hints.strip() and BOILERPLATE_HINTS.search(hints))
+        )
+        self._open.append((tag, boilerplate))
+        self._boilerplate_depth += boilerplate
+        self._content_depth += tag in CONTENT_TAGS
+
+    def _leave(self, tag: str):
+        for i in range(len(self._open) - 1, -1, -1):
+            if self._open[i][0] == tag:
+                for open_tag, boilerplate in self._open[i:]:
+                    self._boilerplate_depth -= boilerplate
+                    self._content_depth -= open_tag in CONTENT_TAGS
+                del self._open[i:]
+                return
+
+    def _newlines(self, count: int):
+        """Make sure the output ends with at least count newlines"""
+        trailing = 0
+        for part in reversed(self.parts):
+            stripped = part.rstrip("\n")
+            trailing += len(part) - len(stripped)
+            if stripped:
+                break
+        if self.parts and trailing < count:
+            self._append("\n" * (count - trailing))
+
+    def start(self, tag: str, attrs: Dict[str, Optional[str]]):
+        tag = tag.lower()
+        # <title> inside <svg> and other skipped elements is not the page title
+        if tag == "title" and (self._head_depth or not self._skip_depth):
+            self._in_title = True
+            return
+        self._head_depth += tag == "head"
+        if tag in SKIP_TAGS or self._skip_depth:
+            if tag not in VOID_TAGS:
+                self._skip_depth += 1
+            return
+        if tag not in VOID_TAGS:
+            self._enter(tag, attrs)
+        if tag in HEADING_TAGS:
+            self._newlines(2)
+            self._append("#" * HEADING_TAGS[tag] + " ")
+        elif tag in ("ul", "ol"):
+            self._newlines(1 if self._lists else 2)
+            self._lists.append([tag, 0])
+        elif tag == "li":
+            self._newlines(1)
+            indent = "  " * max(len(self._lists) - 1, 0)
+            if self._lists and self._lists[-1][0] == "ol":
+                self._lists[-1][1] += 1
+                self._append(f"{indent}{self._lists[-1][1]}. ")
+            else:
+                self._append(f"{indent}- ")
+        elif tag == "pre":
+            self._newlines(2)
+            self._append("```\n")
+            self._pre_depth += 1
+        elif tag == "code" and not self._pre_depth:
+            self._append("`")
+        elif tag in ("strong", "b"):
+            self._append("**")
+        elif tag in ("em", "i"):
+            self._append("*")
+        elif tag == "a":
+            href = attrs.get("href")
+            if href and not href.startswith(("javascript:", "#", "mailto:")):
+                href = urljoin(self.base_url, href) if self.base_url else href
+                self.links.append(href)
+            else:
+                href = None
+            self._anchors.append((len(self.parts), href))
+            self._append("[" if href else "")
+        elif tag == "br":
+            self._append("\n")
+        elif tag == "tr":
+            self._newlines(1)
+            self._append("|")
+        elif tag in ("td", "th"):
+            self._append(" ")
+        elif tag in BLOCK_TAGS:
+            self._newlines(2)
+
+    def end(self, tag: str):
+        tag = tag.lower()
+        if tag == "title" and self._in_title:
+            self._in_title = False
+            return
+        if tag == "head":
+            self._head_depth = max(self._head_depth - 1, 0)
+        if self._skip_depth:
+            if tag not in VOID_TAGS:
+                self._skip_depth -= 1
+            return
+        self._leave(tag)
+        if tag in HEADING_TAGS:
+            self._newlines(2)
+        elif tag in ("ul", "ol"):
+            if self._lists:
+                self._lists.pop()
+            self._newlines(1 if self._lists else 2)
+        elif tag == "pre":
+            self._newlines(1)
+            self._append("```")
+            self._newlines(2)
+            self._pre_depth = max(self._pre_depth - 1, 0)
+        elif tag == "code" and not self._pre_depth:
+            self._append("`")
+        elif tag in ("strong", "b"):
+            self._append("**")
+        elif tag in ("em", "i"):
+            self._append("*")
+        elif tag in ("td", "th"):
+            self._append(" |")
+        elif tag == "tr":
+            self._newlines(1)
+        elif tag == "a" and self._anchors:
+            index, href = self._anchors.pop()
+            if href:
+                if "".join(self.parts[index + 1:]).strip():
+                    self._append(f"]({href})")
+                else:
+                    self.parts[index] = ""  # drop links without text
+        elif tag in BLOCK_TAGS:
+            self._newlines(2)
+
+    def text(self, data: str):
+        if not data:
+            return
+        if self._in_title:
+            self.title_parts.append(data)
+            return
+        if self._skip_depth:
+            return
+        if self._pre_depth:
+            self._append(data)
+            return
+        # collapse whitespace runs to single spaces (str.split is much faster than re.sub here)
+        collapsed = " ".join(data.split())
+        if data[0].isspace() and self._last_char() not in ("", " ", "\n", "["):
+            collapsed = " " + collapsed
+        if data[-1].isspace() and collapsed and not collapsed.endswith(" "):
+            collapsed += " "
+        if collapsed:
+            self._append(collapsed)
+
+    def _last_char(self) -> str:
+        for part in reversed(self.parts):
+            if part:
+                return part[-1]
+        return ""
+
+    def result(self, main_content: bool = False) -> Dict[str, Any]:
+        text = _tidy("".join(self.parts))
+        title = re.sub(r"\s+", " ", "".join(self.title_parts)).strip()
+        page = {"title": title, "markdown": text, "links": self.links}
+        if main_content:
+            main = _tidy("".join(part for part, flag in zip(self.parts, self.flags) if not flag))
+            main = _drop_link_heavy_blocks(main)
+            if len(main) < min(200, len(text) // 5):
+                main = text  # extraction found no convincing main content, keep the whole page
+            page["markdown"] = main
+            page["stats"] = {
+                "chars_in": len(text),
+                "chars_out": len(main),
+                "chars_saved": len(text) - len(main),
+                "tokens_saved_estimate": tokens_for_chars(len(text) - len(main)),
+            }
+        return page
+
+
+def _tidy(text: str) -> str:
+    text = re.sub(r"[ \t]+\n", "\n", text)  # trailing spaces
+    text = re.sub(r"\n{3,}", "\n\n", text)
+    return text.strip()
+
+
+def _drop_link_heavy_blocks(text: str) -> str:
+    """
+    Remove paragraphs that are mostly link text or too short to be content,
+    then headings left without any content below them
+    """
+    kept = []
+    for block in text.split("\n\n"):
+        if block.startswith(("#", "```", "|")):
+            kept.append(block)
+            continue
+        link_chars = sum(len(m.group(1)) for m in MARKDOWN_LINK.finditer(block))
+        visible = MARKDOWN_LINK.sub(lambda m: m.group(1), block).strip()
+        if not visible:
+            continue
+        if link_chars / len(visible) > 0.5:
+            continue
+        if len(visible.split()) < 5 and not visible.endswith((".", "!", "?", ":")):
+            continue
+        kept.append(block)
+
+    result = []
+    for i, block in enumerate(kept):
+        if block.startswith("#"):
+            level = len(block) - len(block.lstrip("#"))
+            following = kept[i + 1] if i + 1 < len(kept) else None
+            if following is None or (
+                following.startswith("#") and len(following) - len(following.lstrip("#")) <= level
+            ):
+                continue
+        result.append(block)
+    return "\n\n".join(result)
+
+
+# start tag -> (open elements it closes, elements that stop the search), as in the HTML parsing rules
+_IMPLIED_END = {
+    "td": ({"td", "th"}, {"tr", "table"}),
+    "th": ({"td", "th"}, {"tr", "table"}),
+    "tr": ({"td", "th", "tr"}, {"thead", "tbody", "tfoot", "table"}),
+    "thead": ({"td", "th", "tr", "thead", "tbody", "tfoot"}, {"table"}),
+    "tbody": ({"td", "th", "tr", "thead", "tbody", "tfoot"}, {"table"}),
+    "tfoot": ({"td", "th", "tr", "thead", "tbody", "tfoot"}, {"table"}),
+    "li": ({"li"}, {"ul", "ol", "menu"}),
+    "dt": ({"dt", "dd"}, {"dl"}),
+    "dd": ({"dt", "dd"}, {"dl"}),
+    "option": ({"option"}, {"select", "datalist", "optgroup"}),
+}
+# start tags that close an open <p>
+_CLOSES_P = {
+    "address", "article", "aside", "blockquote", "details", "div", "dl", "fieldset", "figure", "footer",
+    "form", "h1", "h2", "h3", "h4", "h5", "h6", "header", "hr", "main", "nav", "ol", "p", "pre",
+    "section", "table", "ul",
+}
+_P_SCOPE = {"button", "caption", "table", "td", "th", "html", "object", "template"}
+
+
+class _StdlibParser(HTMLParser):
+    """
+    html.parser reports tags exactly as written, so this keeps a stack of open
+    elements and emits the end tags an HTML parser implies (an unclosed <td>,
+    <li> or <p> before the next one, everything left open at a parent's end
+    tag or at the end of the document), to match the lxml and selectolax trees
+    """
+
+    def __init__(self, writer: MarkdownWriter):
+        super().__init__(convert_charrefs=True)
+        self.writer = writer
+        self.open: List[str] = []
+
+    def _close_from(self, index: int):
+        while len(self.open) > index:
+            self.writer.end(self.open.pop())
+
+    def _close_implied(self, tag: str):
+        closes, boundary = _IMPLIED_END.get(tag, ((), ()))
+        if tag in _CLOSES_P:
+            closes, boundary = set(closes) | {"p"}, set(boundary) | _P_SCOPE
+        for index in range(len(self.open) - 1, -1, -1):
+            if self.open[index] in closes:
+                self._close_from(index)
+                return
+            if self.open[index] in boundary:
+                return
+
+    def handle_starttag(self, tag, attrs):
+        self._close_implied(tag)
+        self.writer.start(tag, dict(attrs))
+        if tag not in VOID_TAGS:
+            self.open.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self._close_implied(tag)
+        self.writer.start(tag, dict(attrs))
+        if tag not in VOID_TAGS:
+            self.writer.end(tag)
+
+    def handle_endtag(self, tag):
+        # close the innermost open element of this name and anything left open inside it;
+        # a stray end tag is dropped, as an HTML parser does
+        for index in range(len(self.open) - 1, -1, -1):
+            if self.open[index] == tag:
+                self._close_from(index)
+                return
+
+    def handle_data(self, data):
+        self.writer.text(data)
+
+    def close(self):
+        super().close()
+        self._close_from(0)
+
+
+def _convert_stdlib(html_text: str, writer: MarkdownWriter):
+    parser = _StdlibParser(writer)
+    parser.feed(html_text)
+    parser.close()
+
+
+def _convert_lxml(html_text: str, writer: MarkdownWriter):
+    from lxml import etree
+    import lxml.html
+
+    if not html_text.strip():
+        return
+    try:
+        # lxml refuses str input that carries an encoding declaration, as XHTML pages often do
+        root = lxml.html.document_fromstring(_XML_DECLARATION.sub("", html_text, count=1))
+    except (etree.ParserError, ValueError):
+        _convert_stdlib(html_text, writer)
+        return
+    for event, element in etree.iterwalk(root, events=("start", "end")):
+        tag = element.tag
+        if not isinstance(tag, str):  # comment or processing instruction
+            if event == "end":
+                writer.text(element.tail)
+            continue
+        if event == "start":
+            writer.start(tag, element.attrib)
+            writer.text(element.text)
+        else:
+            if tag not in VOID_TAGS:
+                writer.end(tag)
+            writer.text(element.tail)
+
+
+def _convert_selectolax(html_text: str, writer: MarkdownWriter):
+    try:
+        from selectolax.lexbor import LexborHTMLParser as SelectolaxParser
+    except ImportError:
+        from selectolax.parser import HTMLParser as SelectolaxParser
+
+    root = SelectolaxParser(html_text).root
+    stack = [(root, False)] if root is not None else []
+    while stack:
+        node, leaving = stack.pop()
+        if leaving:
+            if node.tag not in VOID_TAGS:
+                writer.end(node.tag)
+            continue
+        tag = node.tag
+        if tag == "-text":
+            writer.text(node.text(deep=False))
+        elif not tag.startswith("-"):  # skip comments and doctype
+            writer.start(tag, node.attributes)
+            stack.append((node, True))
+            children = []
+            child = node.child
+            while child is not None:
+                children.append(child)
+                child = child.next
+            stack.extend((child, False) for child in reversed(children))
+
+
+def _convert_bs4(html_text: str, base_url: Optional[str]) -> Dict[str, Any]:
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html_text, "html.parser")
+    title = soup.title.string if soup.title and soup.title.string else ""
+    text = soup.get_text()
+    text = re.sub(r"\n\s*\n", "\n\n", text)  # Remove multiple blank lines
+    text = re.sub(r" +", " ", text)  # Remove multiple spaces
+    text = html.unescape(text)  # Convert HTML entities
+    links = [
+        urljoin(base_url, a["href"]) if base_url else a["href"]
+        for a in soup.find_all("a", href=True)
+        if not a["href"].startswith(("javascript:", "#", "mailto:"))
+    ]
+    return {"title": title.strip(), "markdown": text.strip(), "links": links}
+
+
+ENGINES = {
+    "lxml": _convert_lxml,
+    "selectolax": _convert_selectolax,
+    "html.parser": _convert_stdlib,
+}
+
+
+def available_engines() -> List[str]:
+    """Names of the engines whose parser can be imported, fastest first"""
+    engines = []
+    for name, module in (("lxml", "lxml.html"), ("selectolax", "selectolax"),
+                         ("html.parser", "html.parser"), ("bs4", "bs4")):
+        try:
+            __import__(module)
+            engines.append(name)
+        except ImportError:
+            pass
+    return engines
+
+
+_default_engine = None
+
+
+def default_engine() -> str:
+    """The first available of lxml, selectolax and html.parser"""
+    global _default_engine
+    if _default_engine is None:
+        _default_engine = available_engines()[0]
+    return _default_engine
+
+
+def convert_html(
+    html_text: str,
+    engine: Optional[str] = None,
+    base_url: Optional[str] = None,
+    main_content: bool = False,
+) -> Dict[str, Any]:
+    """
+    Converts an HTML document to markdown in one pass
+
+    Args:
+        html_text (str): HTML document
+        engine (str): "lxml", "selectolax", "html.parser" or "bs4"; defaults to default_engine()
+        base_url (str): used to make link URLs absolute
+        main_content (bool): keep only the main article text, dropping navigation,
+            headers/footers, cookie banners, sidebars and link-heavy blocks
+
+    Returns:
+        dict with "title", "markdown" and "links" (absolute link URLs in document order);
+        with main_content=True also "stats" with chars_in, chars_out, chars_saved
+        and tokens_saved_estimate
+    """
+    engine = engine or default_engine()
+    if engine == "bs4":
+        return _convert_bs4(html_text, base_url)
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown HTML engine: {engine}")
+    writer = MarkdownWriter(base_url)
+    ENGINES[engine](html_text, writer)
+    return writer.result(main_content)
+
+
+# Export the functions
+__all__ = ["convert_html", "available_engines", "default_engine", "MarkdownWriter"]
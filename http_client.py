@@ -0,0 +1,115 @@
+"""
+Shared HTTP client for the web tools
+
+One requests.Session is shared by all callers. Its urllib3 pool keeps
+keep-alive connections per host, failed GETs are retried with exponential
+backoff on 429 and 5xx responses (honoring Retry-After), and every request
+gets a timeout. requests is imported when the session is first created.
+"""
+
+import sys
+import threading
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+if TYPE_CHECKING:
+    import requests
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+}
+
+_config: Dict[str, Any] = {
+    "timeout": (5, 15),  # (connect, read) seconds
+    "retries": 3,
+    "backoff_factor": 0.5,  # sleeps 0.5, 1, 2, ... seconds between retries
+    "status_forcelist": (429, 500, 502, 503, 504),
+    "pool_connections": 32,  # number of hosts with a cached connection pool
+    "pool_maxsize": 8,  # keep-alive connections per host
+    "pool_block": True,  # wait for a free connection instead of exceeding pool_maxsize
+}
+_session: Optional["requests.Session"] = None
+_lock = threading.Lock()
+
+
+def configure(**settings):
+    """
+    Change client settings (timeout, retries, backoff_factor, status_forcelist,
+    pool_connections, pool_maxsize, pool_block); the shared session is rebuilt
+    on next use
+    """
+    global _session
+    unknown = set(settings) - set(_config)
+    if unknown:
+        raise ValueError(f"Unknown HTTP client settings: {', '.join(sorted(unknown))}")
+    with _lock:
+        _config.update(settings)
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+def get_session() -> "requests.Session":
+    """Return the shared session, creating it on first use"""
+    global _session
+    with _lock:
+        if _session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
+
+            retry = Retry(
+                total=_config["retries"],
+                backoff_factor=_config["backoff_factor"],
+                status_forcelist=_config["status_forcelist"],
+                allowed_methods=frozenset(["GET", "HEAD"]),
+                respect_retry_after_header=True,
+                raise_on_status=False,  # return the last response, callers check status codes
+            )
+            adapter = HTTPAdapter(
+                pool_connections=_config["pool_connections"],
+                pool_maxsize=_config["pool_maxsize"],
+                pool_block=_config["pool_block"],
+                max_retries=retry,
+            )
+            session = requests.Session()
+            session.headers.update(DEFAULT_HEADERS)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+        return _session
+
+
+def http_get(
+    url: str,
+    headers: Optional[Dict[str, str]] = None,
+    params: Optional[Dict[str, Any]] = None,
+    timeout: Optional[Any] = None,
+    stream: bool = False,
+) -> "requests.Response":
+    """GET a URL through the shared session; timeout defaults to the configured value"""
+    return get_session().get(
+        url,
+        headers=headers,
+        params=params,
+        timeout=timeout if timeout is not None else _config["timeout"],
+        stream=stream,
+    )
+
+
+def is_request_error(e: BaseException) -> bool:
+    """True for requests network and HTTP errors, without importing requests"""
+    requests = sys.modules.get("requests")
+    return requests is not None and isinstance(e, requests.RequestException)
+
+
+def close():
+    """Close the shared session and its pooled connections"""
+    global _session
+    with _lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+# Export the functions
+__all__ = ["configure", "get_session", "http_get", "is_request_error", "close", "DEFAULT_HEADERS"]
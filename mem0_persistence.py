@@ -7,8 +7,8 @@
 
 import argparse
 from mem0 import Memory
-from ollama import chat
 from ollama import ChatResponse
+from ollama_client import chat
            
 USER_ID = "123"
 
@@ -0,0 +1,443 @@
+"""
+Shared Ollama client for the tools
+
+One ollama.Client, and so one pooled httpx connection pool, is shared by all
+callers. chat() and generate() fill in a keep_alive for the model so it stays
+loaded between bursts of calls, and warm_up() loads models ahead of the first
+real request. The host defaults to OLLAMA_HOST; point configure(host=...) at
+fake_ollama_server for tests. ollama itself is imported on first use.
+
+Every call waits its turn in a ModelScheduler, which groups requests by model
+so interleaved callers do not make the server load and unload models over and
+over (see configure_scheduler and scheduler_stats).
+"""
+
+import contextvars
+import itertools
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, List, Optional, Union
+
+if TYPE_CHECKING:
+    import ollama
+
+_config: Dict[str, Any] = {
+    "host": None,  # None uses OLLAMA_HOST or http://localhost:11434
+    "connect_timeout": 5.0,
+    "read_timeout": 600.0,  # a long generation on a slow machine can take minutes
+    "max_connections": 16,
+    "max_keepalive_connections": 8,
+    "keep_alive": "30m",  # default for models without their own setting
+}
+_keep_alive: Dict[str, Union[float, str]] = {}
+_client: Optional["ollama.Client"] = None
+_lock = threading.Lock()
+
+
+@dataclass
+class _Ticket:
+    model: str
+    priority: int
+    caller: str
+    seq: int
+    thread: Optional[int]  # None when the ticket is not tied to the thread that waited for it
+    on_grant: Optional[Callable[["_Ticket"], None]] = None
+    enqueued: float = field(default_factory=time.perf_counter)
+    granted: bool = False
+
+
+class ModelScheduler:
+    """
+    Queue in front of the Ollama server that keeps requests for a model together
+
+    Requests for at most max_models models run at once, at most per_model of
+    them per model (match OLLAMA_MAX_LOADED_MODELS and OLLAMA_NUM_PARALLEL);
+    a request for another model waits until a running model drains. A running
+    model stops admitting requests while another model waits once it has
+    admitted batch_size more, or when the waiting model has a more urgent
+    request, so no model starves. Among a model's requests, lower priority
+    values go first, then the caller served least so far, then the oldest.
+
+    A thread that already holds a slot (a nested call, or a call made while
+    consuming a stream) is admitted at once so it cannot deadlock on itself.
+    """
+
+    def __init__(self, max_models: int = 3, per_model: int = 4, batch_size: int = 16):
+        self.max_models = max_models
+        self.per_model = per_model
+        self.batch_size = batch_size
+        self._cond = threading.Condition()
+        self._pending: Dict[str, List[_Ticket]] = {}
+        self._running: Dict[str, int] = {}
+        self._streak: Dict[str, int] = {}  # requests admitted while other models waited
+        self._recent: "OrderedDict[str, None]" = OrderedDict()  # models the server most likely has loaded
+        self._held: Counter = Counter()  # slots held per thread
+        self._served: Counter = Counter()
+        self._seq = itertools.count()
+        self._stats: Dict[str, Any] = {"requests": 0, "model_switches": 0, "wait_seconds": 0.0,
+                                       "max_wait_seconds": 0.0, "models": {}, "callers": {}}
+
+    def acquire(self, model: str, priority: int = 0, caller: str = "default") -> _Ticket:
+        """Block until model may run; pass the returned ticket to release()"""
+        ticket = _Ticket(model, priority, caller, next(self._seq), threading.get_ident())
+        with self._cond:
+            if self._held[ticket.thread]:
+                self._grant(ticket)
+                return ticket
+            self._pending.setdefault(model, []).append(ticket)
+            self._dispatch()
+            while not ticket.granted:
+                self._cond.wait()
+        return ticket
+
+    def submit(self, model: str, on_grant: Callable[[_Ticket], None], priority: int = 0,
+               caller: str = "default") -> _Ticket:
+        """
+        Queue a request without waiting for it; on_grant(ticket) is called,
+        with the scheduler locked and possibly from another thread, once model
+        may run. Pass the ticket to release() when done, or to cancel() to
+        give up on it
+        """
+        ticket = _Ticket(model, priority, caller, next(self._seq), None, on_grant)
+        with self._cond:
+            self._pending.setdefault(model, []).append(ticket)
+            self._dispatch()
+        return ticket
+
+    def cancel(self, ticket: _Ticket) -> bool:
+        """Withdraw a queued ticket; False if it was already granted and must be released"""
+        with self._cond:
+            if ticket.granted:
+                return False
+            self._pending[ticket.model].remove(ticket)
+            if not self._pending[ticket.model]:
+                del self._pending[ticket.model]
+            self._dispatch()  # the withdrawn ticket may have been holding back other models
+            return True
+
+    def release(self, ticket: _Ticket):
+        with self._cond:
+            if ticket.thread is not None:
+                self._held[ticket.thread] -= 1
+                if not self._held[ticket.thread]:
+                    del self._held[ticket.thread]
+            self._running[ticket.model] -= 1
+            if not self._running[ticket.model]:
+                del self._running[ticket.model]
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, model: str, priority: int = 0, caller: str = "default"):
+        ticket = self.acquire(model, priority, caller)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def _best(self, model: str) -> _Ticket:
+        return min(self._pending[model], key=lambda t: (t.priority, self._served[t.caller], t.seq))
+
+    def _next_ticket(self) -> Optional[_Ticket]:
+        best = {model: self._best(model) for model in self._pending}
+        candidates = []
+        for model, ticket in best.items():
+            if model in self._running:
+                others = [other for other in best if other not in self._running]
+                if self._running[model] >= self.per_model:
+                    continue
+                if others and (self._streak[model] >= self.batch_size
+                               or min(best[other].priority for other in others) < ticket.priority):
+                    continue
+                candidates.append(ticket)
+            elif len(self._running) < self.max_models:
+                candidates.append(ticket)
+        if not candidates:
+            return None
+        # most urgent first, then models already running or loaded, then the oldest
+        return min(candidates, key=lambda t: (t.priority, t.model not in self._running,
+                                              t.model not in self._recent, t.seq))
+
+    def _dispatch(self):
+        granted = False
+        while True:
+            ticket = self._next_ticket()
+            if ticket is None:
+                break
+            self._pending[ticket.model].remove(ticket)
+            if not self._pending[ticket.model]:
+                del self._pending[ticket.model]
+            self._grant(ticket)
+            granted = True
+        if granted:
+            self._cond.notify_all()
+
+    def _grant(self, ticket: _Ticket):
+        model = ticket.model
+        if model not in self._running:
+            self._streak[model] = 0
+            if model not in self._recent:
+                self._stats["model_switches"] += 1
+            self._recent[model] = None
+            self._recent.move_to_end(model)
+            while len(self._recent) > self.max_models:
+                self._recent.popitem(last=False)
+        elif any(other not in self._running for other in self._pending):
+            self._streak[model] += 1
+        self._running[model] = self._running.get(model, 0) + 1
+        if ticket.thread is not None:
+            self._held[ticket.thread] += 1
+        self._served[ticket.caller] += 1
+        ticket.granted = True
+        if ticket.on_grant is not None:
+            ticket.on_grant(ticket)
+
+        wait = time.perf_counter() - ticket.enqueued
+        self._stats["requests"] += 1
+        self._stats["wait_seconds"] += wait
+        self._stats["max_wait_seconds"] = max(self._stats["max_wait_seconds"], wait)
+        for group, name in (("models", model), ("callers", ticket.caller)):
+            entry = self._stats[group].setdefault(name, {"requests": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0})
+            entry["requests"] += 1
+            entry["wait_seconds"] += wait
+            entry["max_wait_seconds"] = max(entry["max_wait_seconds"], wait)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Requests admitted, model switches (models started that were not among
+        the last max_models run, including the first), queue wait totals and
+        maxima overall, per model and per caller, and requests still queued
+        """
+        with self._cond:
+            stats = {key: value for key, value in self._stats.items() if key not in ("models", "callers")}
+            stats["mean_wait_seconds"] = stats["wait_seconds"] / stats["requests"] if stats["requests"] else 0.0
+            stats["queued"] = sum(len(tickets) for tickets in self._pending.values())
+            stats["models"] = {name: dict(entry) for name, entry in self._stats["models"].items()}
+            stats["callers"] = {name: dict(entry) for name, entry in self._stats["callers"].items()}
+            return stats
+
+
+def _scheduler_from_env() -> ModelScheduler:
+    return ModelScheduler(
+        max_models=int(os.environ.get("OLLAMA_MAX_LOADED_MODELS", 3)),  # Ollama's default (per GPU)
+        per_model=int(os.environ.get("OLLAMA_NUM_PARALLEL", 4)),
+    )
+
+
+_scheduler: Optional[ModelScheduler] = _scheduler_from_env()
+_request = contextvars.ContextVar("ollama_request", default=(0, "default"))
+
+
+def configure(**settings):
+    """
+    Change client settings (host, connect_timeout, read_timeout, max_connections,
+    max_keepalive_connections, keep_alive); the shared client is rebuilt on next use
+    """
+    global _client
+    unknown = set(settings) - set(_config)
+    if unknown:
+        raise ValueError(f"Unknown Ollama client settings: {', '.join(sorted(unknown))}")
+    with _lock:
+        _config.update(settings)
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+def set_keep_alive(model: str, keep_alive: Union[float, str]):
+    """How long the server keeps model loaded after a request, e.g. "1h", 600 or -1 (forever)"""
+    _keep_alive[model] = keep_alive
+
+
+def keep_alive_for(model: str) -> Union[float, str]:
+    if model in _keep_alive:
+        return _keep_alive[model]
+    return _keep_alive.get(model.split(":")[0], _config["keep_alive"])
+
+
+def _client_options() -> Dict[str, Any]:
+    import httpx
+
+    return {
+        "host": _config["host"],
+        "timeout": httpx.Timeout(_config["read_timeout"], connect=_config["connect_timeout"]),
+        "limits": httpx.Limits(
+            max_connections=_config["max_connections"],
+            max_keepalive_connections=_config["max_keepalive_connections"],
+        ),
+    }
+
+
+def get_client() -> "ollama.Client":
+    """Return the shared client, creating it on first use"""
+    global _client
+    with _lock:
+        if _client is None:
+            import ollama
+
+            _client = ollama.Client(**_client_options())
+        return _client
+
+
+def async_client() -> "ollama.AsyncClient":
+    """A new AsyncClient with the shared settings (httpx async clients belong to one event loop)"""
+    import ollama
+
+    return ollama.AsyncClient(**_client_options())
+
+
+def configure_scheduler(enabled: bool = True, max_models: Optional[int] = None, per_model: Optional[int] = None,
+                        batch_size: int = 16):
+    """
+    Replace the request scheduler (limits default to OLLAMA_MAX_LOADED_MODELS
+    or 3 and OLLAMA_NUM_PARALLEL or 4, as on the server; set max_models=1 when
+    only one model fits in memory); enabled=False sends calls straight to the
+    server. Call it while no requests are in flight.
+    """
+    global _scheduler
+    if not enabled:
+        _scheduler = None
+        return
+    default = _scheduler_from_env()
+    _scheduler = ModelScheduler(
+        max_models=max_models or default.max_models,
+        per_model=per_model or default.per_model,
+        batch_size=batch_size,
+    )
+
+
+def scheduler_stats() -> Dict[str, Any]:
+    """See ModelScheduler.stats; empty when the scheduler is disabled"""
+    return _scheduler.stats() if _scheduler is not None else {}
+
+
+@contextmanager
+def request_options(priority: Optional[int] = None, caller: Optional[str] = None):
+    """Default priority (lower runs first) and caller name for calls made inside this block"""
+    current_priority, current_caller = _request.get()
+    token = _request.set((current_priority if priority is None else priority, caller or current_caller))
+    try:
+        yield
+    finally:
+        _request.reset(token)
+
+
+def _request_settings(priority: Optional[int], caller: Optional[str]):
+    default_priority, default_caller = _request.get()
+    return (default_priority if priority is None else priority), caller or default_caller
+
+
+@contextmanager
+def slot(model: str, priority: Optional[int] = None, caller: Optional[str] = None):
+    """Hold a scheduler slot for model, for calls made outside chat() and generate()"""
+    scheduler = _scheduler
+    if scheduler is None:
+        yield
+        return
+    with scheduler.slot(model, *_request_settings(priority, caller)):
+        yield
+
+
+@asynccontextmanager
+async def aslot(model: str, priority: Optional[int] = None, caller: Optional[str] = None):
+    """slot() for asyncio code; waiting for the slot does not block the event loop or a thread"""
+    import asyncio
+
+    scheduler = _scheduler
+    if scheduler is None:
+        yield
+        return
+    loop = asyncio.get_running_loop()
+    granted = loop.create_future()
+
+    def on_grant(ticket: _Ticket):
+        loop.call_soon_threadsafe(lambda: granted.done() or granted.set_result(ticket))
+
+    ticket = scheduler.submit(model, on_grant, *_request_settings(priority, caller))
+    try:
+        await granted
+    except asyncio.CancelledError:
+        if not scheduler.cancel(ticket):
+            scheduler.release(ticket)
+        raise
+    try:
+        yield
+    finally:
+        scheduler.release(ticket)
+
+
+def _scheduled(model: str, priority: Optional[int], caller: Optional[str], stream: bool, call):
+    """Run call() in a scheduler slot; a stream keeps its slot until it is consumed or closed"""
+    if not stream:
+        with slot(model, priority, caller):
+            return call()
+
+    def pieces():
+        with slot(model, priority, caller):
+            yield from call()
+
+    return pieces()
+
+
+def chat(model: str, messages, priority: Optional[int] = None, caller: Optional[str] = None, **kwargs):
+    """ollama chat through the scheduler and the shared client, with the model's keep_alive"""
+    kwargs.setdefault("keep_alive", keep_alive_for(model))
+    return _scheduled(model, priority, caller, kwargs.get("stream", False),
+                      lambda: get_client().chat(model=model, messages=messages, **kwargs))
+
+
+def generate(model: str, prompt: str = "", priority: Optional[int] = None, caller: Optional[str] = None, **kwargs):
+    """ollama generate through the scheduler and the shared client, with the model's keep_alive"""
+    kwargs.setdefault("keep_alive", keep_alive_for(model))
+    return _scheduled(model, priority, caller, kwargs.get("stream", False),
+                      lambda: get_client().generate(model=model, prompt=prompt, **kwargs))
+
+
+def warm_up(models: Iterable[str], keep_alive: Optional[Union[float, str]] = None) -> Dict[str, Any]:
+    """
+    Load models into the server's memory before they are needed
+
+    A generate request without a prompt makes Ollama load the model and
+    return without generating. The requests are sent concurrently and bypass
+    the scheduler, so the server loads the models as fast as it can (it may
+    still load them one after another).
+
+    Returns:
+        dict of model name -> seconds taken, or the error message if loading failed
+    """
+    def load(model: str):
+        start = time.perf_counter()
+        try:
+            get_client().generate(
+                model=model, prompt="", keep_alive=keep_alive if keep_alive is not None else keep_alive_for(model)
+            )
+            return time.perf_counter() - start
+        except Exception as e:
+            return f"Error warming up {model}: {str(e)}"
+
+    models = list(dict.fromkeys(models))
+    if not models:
+        return {}
+    with ThreadPoolExecutor(max_workers=len(models)) as pool:
+        return dict(zip(models, pool.map(load, models)))
+
+
+def close():
+    """Close the shared client and its pooled connections"""
+    global _client
+    with _lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+# Export the functions
+__all__ = [
+    "configure", "set_keep_alive", "keep_alive_for", "get_client", "async_client",
+    "chat", "generate", "warm_up", "close", "ModelScheduler", "configure_scheduler",
+    "scheduler_stats", "request_options", "slot", "aslot",
+]
@@ -1,5 +1,6 @@
+import time
 import openai
-from typing import List, Dict
+from typing import Any, Dict, Iterator, List, Optional
 
 class OllamaClient:
     def __init__(self, base_url: str = "http://localhost:11434/v1"):
@@ -8,6 +9,62 @@ class OllamaClient:
             api_key="fake-key"  # Ollama doesn't require authentication locally
         )
 
+    def _stream(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        stats: Optional[Dict[str, Any]] = None,
+        **options
+    ) -> Iterator[str]:
+        """
+        Yield the completion in pieces as they arrive; when done, fill in stats with
+        "ttft" (seconds to the first token, None if no content arrived), "seconds",
+        "tokens" and "tokens_per_sec"
+        """
+        start = time.perf_counter()
+        first_token = None
+        tokens = 0
+        usage_tokens = None
+        response = self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            stream=True,
+            stream_options={"include_usage": True},
+            **options
+        )
+        for chunk in response:
+            if chunk.usage is not None:
+                usage_tokens = chunk.usage.completion_tokens
+            if chunk.choices and chunk.choices[0].delta.content:
+                if first_token is None:
+                    first_token = time.perf_counter()
+                tokens += 1
+                yield chunk.choices[0].delta.content
+        if stats is not None:
+            end = time.perf_counter()
+            tokens = usage_tokens or tokens
+            generating = end - first_token if first_token is not None else 0.0
+            stats.update({
+                "ttft": first_token - start if first_token is not None else None,
+                "seconds": end - start,
+                "tokens": tokens,
+                "tokens_per_sec": tokens / generating if generating > 0 else 0.0,
+            })
+
+    def chat_with_context_stream(
+        self,
+        system_context: str,
+        user_prompt: str,
+        model: str = "llama3.2:latest",
+        temperature: float = 0.7,
+        stats: Optional[Dict[str, Any]] = None
+    ) -> Iterator[str]:
+        messages = [
+            {"role": "system", "content": system_context},
+            {"role": "user", "content": user_prompt}
+        ]
+        return self._stream(messages, model, stats, temperature=temperature)
+
     def chat_with_context(
         self,
         system_context: str,
@@ -16,36 +73,26 @@ class OllamaClient:
         temperature: float = 0.7
     ) -> str:
         try:
-            messages = [
-                {"role": "system", "content": system_context},
-                {"role": "user", "content": user_prompt}
-            ]
-
-            response = self.client.chat.completions.create(
-                model=model,
-                messages=messages,
-                temperature=temperature,
-                stream=False
-            )
-
-            return response.choices[0].message.content
+            return "".join(self.chat_with_context_stream(system_context, user_prompt, model, temperature))
 
         except Exception as e:
             return f"Error: {str(e)}"
 
+    def chat_conversation_stream(
+        self,
+        messages: List[Dict[str, str]],
+        model: str = "llama2",
+        stats: Optional[Dict[str, Any]] = None
+    ) -> Iterator[str]:
+        return self._stream(messages, model, stats)
+
     def chat_conversation(
         self,
         messages: List[Dict[str, str]],
         model: str = "llama2"
     ) -> str:
         try:
-            response = self.client.chat.completions.create(
-                model=model,
-                messages=messages,
-                stream=False
-            )
-
-            return response.choices[0].message.content
+            return "".join(self.chat_conversation_stream(messages, model))
 
         except Exception as e:
             return f"Error: {str(e)}"
@@ -71,6 +118,17 @@ def main():
     print(response)
     print("\n" + "="*50 + "\n")
 
+    # Example 1b: the same request, printing tokens as they arrive
+    print("Streamed response with context:")
+    stats = {}
+    for piece in client.chat_with_context_stream(system_context, user_prompt, stats=stats):
+        print(piece, end="", flush=True)
+    if stats.get("ttft") is not None:
+        print(f"\n\n(time to first token {stats['ttft']:.2f} sec, {stats['tokens_per_sec']:.1f} tokens/sec)")
+    else:
+        print("\n\n(no content was streamed)")
+    print("\n" + "="*50 + "\n")
+
     # Example 2: Multi-turn conversation
     conversation = [
         {"role": "system", "content": "You are a helpful AI assistant."},
@@ -0,0 +1,336 @@
+"""
+Bounded asyncio crawler that converts a whole site to markdown
+
+Starting from a seed URL the crawler follows same-domain links breadth first,
+up to a maximum link depth and page budget, and writes one JSON line per page
+as soon as the page is converted:
+
+    {"url": ..., "depth": ..., "title": ..., "markdown": ..., "content_hash": ..., "links": [...]}
+
+Pages are fetched with the shared HTTP session and converted with the same
+pipeline as uri_to_markdown. Fetches to a host are limited to per_host_limit
+at once and started at least delay seconds apart. URLs are deduplicated after
+normalization and pages with the same markdown are written only once.
+
+The output file doubles as the checkpoint: together with a small
+<output>.checkpoint.json file holding the pending frontier, crawl(resume=True)
+continues an interrupted crawl without fetching written pages again.
+
+Run with:
+
+    python site_crawler.py https://example.com/docs/ docs.jsonl --max-depth 3 --max-pages 500
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import tool_web_search
+from html_markdown import convert_html
+from http_client import http_get, is_request_error
+
+TRACKING_PARAMS = ("utm_", "fbclid", "gclid")
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def normalize_url(url: str) -> Optional[str]:
+    """
+    Canonical form of an http(s) URL used for deduplication: lower-case scheme
+    and host, no default port, no fragment, no tracking parameters and sorted
+    query parameters; None for other schemes
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS or not parts.hostname:
+        return None
+    host = parts.hostname.lower()
+    if parts.port and parts.port != DEFAULT_PORTS[scheme]:
+        host = f"{host}:{parts.port}"
+    query = urlencode(sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith(TRACKING_PARAMS)
+    ))
+    return urlunsplit((scheme, host, parts.path or "/", query, ""))
+
+
+def content_hash(markdown: str) -> str:
+    return hashlib.sha256(" ".join(markdown.split()).encode("utf-8")).hexdigest()
+
+
+@dataclass
+class _Host:
+    """Concurrency limit and politeness timer for one host"""
+    semaphore: asyncio.Semaphore
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    next_request: float = 0.0
+
+
+class SiteCrawler:
+    """
+    Breadth-first crawler for the pages of one site (see module docstring)
+
+    Args:
+        seed (str): URL to start from; only links on the same host are followed
+        output_path (str): JSONL file the pages are written to
+        max_depth (int): maximum number of links followed from the seed
+        max_pages (int): maximum number of pages fetched
+        concurrency (int): maximum pages fetched or converted at once
+        per_host_limit (int): maximum concurrent fetches from one host
+        delay (float): minimum seconds between the starts of two fetches from one host
+        checkpoint_every (int): pages between checkpoint writes
+        main_content (bool): keep only the main content of each page
+    """
+
+    def __init__(
+        self,
+        seed: str,
+        output_path: str,
+        max_depth: int = 2,
+        max_pages: int = 100,
+        concurrency: int = 8,
+        per_host_limit: int = 2,
+        delay: float = 0.5,
+        checkpoint_every: int = 20,
+        main_content: bool = True,
+    ):
+        self.seed = normalize_url(seed)
+        if self.seed is None:
+            raise ValueError(f"Invalid seed URL: {seed}")
+        self.host = urlsplit(self.seed).netloc
+        self.output_path = output_path
+        self.checkpoint_path = output_path + ".checkpoint.json"
+        self.max_depth = max_depth
+        self.max_pages = max_pages
+        self.concurrency = concurrency
+        self.per_host_limit = per_host_limit
+        self.delay = delay
+        self.checkpoint_every = checkpoint_every
+        self.main_content = main_content
+        self.stats = {"written": 0, "duplicates": 0, "errors": 0, "skipped": 0}
+        self._seen: Set[str] = set()  # every URL ever scheduled
+        self._pending: Dict[str, int] = {}  # scheduled but not finished: URL -> depth
+        self._hashes: Set[str] = set()
+        self._hosts: Dict[str, _Host] = {}
+
+    # --- state -----------------------------------------------------------
+
+    def _schedule(self, url: str, depth: int, queue: Optional[asyncio.Queue] = None) -> bool:
+        if url in self._seen or len(self._seen) >= self.max_pages or depth > self.max_depth:
+            return False
+        self._seen.add(url)
+        self._pending[url] = depth
+        if queue is not None:
+            queue.put_nowait((url, depth))
+        return True
+
+    def _same_site_links(self, links: List[str]) -> List[str]:
+        result = []
+        for link in links:
+            url = normalize_url(link)
+            if url is not None and urlsplit(url).netloc == self.host and url not in result:
+                result.append(url)
+        return result
+
+    def _load(self):
+        """Restore the crawl state from the checkpoint file and the pages already written"""
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, encoding="utf-8") as f:
+                checkpoint = json.load(f)
+            self._seen = set(checkpoint["seen"])
+            self._pending = dict(checkpoint["pending"])
+            self._hashes = set(checkpoint["hashes"])
+        records = []
+        if os.path.exists(self.output_path):
+            with open(self.output_path, "rb+") as f:
+                data = f.read()
+                complete = data.rfind(b"\n") + 1
+                if complete < len(data):  # drop a line cut short by a crash
+                    f.truncate(complete)
+            for line in data[:complete].decode("utf-8").splitlines():
+                records.append(json.loads(line))
+        # pages written after the last checkpoint are done; their links may not be scheduled yet
+        for record in records:
+            self._seen.add(record["requested_url"])
+            self._pending.pop(record["requested_url"], None)
+            self._hashes.add(record["content_hash"])
+        for record in records:
+            for url in record["links"]:
+                self._schedule(url, record["depth"] + 1)
+        if not self._seen:
+            self._schedule(self.seed, 0)
+        return len(records)
+
+    def _save_checkpoint(self):
+        tmp_path = self.checkpoint_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "seed": self.seed,
+                "seen": sorted(self._seen),
+                "pending": self._pending,
+                "hashes": sorted(self._hashes),
+            }, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    # --- fetching --------------------------------------------------------
+
+    def _fetch(self, url: str) -> Tuple[str, Optional[str]]:
+        """Blocking fetch; returns (final URL, HTML text or None for non-HTML content)"""
+        response = http_get(url, stream=True)
+        if not response.ok:
+            response.close()
+        response.raise_for_status()
+        if "html" not in response.headers.get("Content-Type", "text/html"):
+            response.close()
+            return response.url, None
+        return response.url, tool_web_search._read_limited(response, tool_web_search.MAX_PAGE_BYTES)
+
+    async def _polite_fetch(self, url: str) -> Tuple[str, Optional[str]]:
+        host_name = urlsplit(url).netloc
+        host = self._hosts.get(host_name)
+        if host is None:
+            host = self._hosts[host_name] = _Host(asyncio.Semaphore(self.per_host_limit))
+        async with host.semaphore:
+            async with host.lock:
+                loop = asyncio.get_running_loop()
+                wait = host.next_request - loop.time()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                host.next_request = loop.time() + self.delay
+            return await asyncio.to_thread(self._fetch, url)
+
+    def _convert(self, url: str, html_text: str) -> Dict[str, Any]:
+        return convert_html(html_text, tool_web_search.HTML_ENGINE, base_url=url, main_content=self.main_content)
+
+    async def _crawl_page(self, url: str, depth: int, queue: asyncio.Queue, out) -> None:
+        try:
+            final_url, html_text = await self._polite_fetch(url)
+            if html_text is None:
+                self.stats["skipped"] += 1
+                return
+            page = await asyncio.to_thread(self._convert, final_url, html_text)
+        except Exception as e:
+            self.stats["errors"] += 1
+            kind = "Network error" if is_request_error(e) else "Error processing URI"
+            logging.warning(f"{kind}: {url}: {e}")
+            return
+
+        digest = content_hash(page["markdown"])
+        if digest in self._hashes:
+            self.stats["duplicates"] += 1
+            return
+        self._hashes.add(digest)
+        links = self._same_site_links(page["links"])
+        out.write(json.dumps({
+            "url": final_url,
+            "requested_url": url,
+            "depth": depth,
+            "title": page["title"],
+            "markdown": page["markdown"],
+            "content_hash": digest,
+            "links": links,
+        }) + "\n")
+        out.flush()
+        self.stats["written"] += 1
+        if depth < self.max_depth:
+            for link in links:
+                self._schedule(link, depth + 1, queue)
+
+    async def _worker(self, queue: asyncio.Queue, out):
+        while True:
+            url, depth = await queue.get()
+            try:
+                await self._crawl_page(url, depth, queue, out)
+                self._pending.pop(url, None)  # a cancelled page stays pending for resume
+                if sum(self.stats.values()) % self.checkpoint_every == 0:
+                    self._save_checkpoint()
+            except Exception as e:
+                # e.g. the output or checkpoint could not be written; the page stays
+                # pending for a resume and this worker goes on with the next one
+                self.stats["errors"] += 1
+                logging.warning(f"Error crawling {url}: {e}")
+            finally:
+                queue.task_done()
+
+    # --- public API ------------------------------------------------------
+
+    async def crawl(self, resume: bool = False) -> Dict[str, Any]:
+        """
+        Crawl until the frontier is empty or the page budget is used up
+
+        Args:
+            resume (bool): continue from the output and checkpoint files of an
+                earlier run instead of starting over
+
+        Returns:
+            dict with written, duplicates, errors and skipped page counts,
+            resumed_pages, seconds and pages_per_sec
+        """
+        if resume:
+            resumed = self._load()
+        else:
+            for path in (self.output_path, self.checkpoint_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            resumed = 0
+            self._schedule(self.seed, 0)
+
+        # BFS: the queue is FIFO, so pages are fetched in order of depth
+        queue: asyncio.Queue = asyncio.Queue()
+        for url, depth in sorted(self._pending.items(), key=lambda item: item[1]):
+            queue.put_nowait((url, depth))
+        start = time.perf_counter()
+        with open(self.output_path, "a", encoding="utf-8") as out:
+            workers = [asyncio.create_task(self._worker(queue, out)) for _ in range(self.concurrency)]
+            try:
+                await queue.join()
+            finally:
+                for worker in workers:
+                    worker.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+                self._save_checkpoint()
+        seconds = time.perf_counter() - start
+        fetched = sum(self.stats.values())
+        return {
+            **self.stats,
+            "resumed_pages": resumed,
+            "seconds": seconds,
+            "pages_per_sec": fetched / seconds if seconds > 0 else 0.0,
+        }
+
+
+def crawl_site(seed: str, output_path: str, resume: bool = False, **settings) -> Dict[str, Any]:
+    """Blocking wrapper around SiteCrawler(seed, output_path, **settings).crawl(resume)"""
+    return asyncio.run(SiteCrawler(seed, output_path, **settings).crawl(resume))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crawl a site and write its pages as markdown JSONL")
+    parser.add_argument("seed")
+    parser.add_argument("output")
+    parser.add_argument("--max-depth", type=int, default=2)
+    parser.add_argument("--max-pages", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--per-host-limit", type=int, default=2)
+    parser.add_argument("--delay", type=float, default=0.5)
+    parser.add_argument("--resume", action="store_true")
+    args = parser.parse_args()
+    stats = crawl_site(
+        args.seed, args.output, resume=args.resume, max_depth=args.max_depth,
+        max_pages=args.max_pages, concurrency=args.concurrency,
+        per_host_limit=args.per_host_limit, delay=args.delay,
+    )
+    print(json.dumps(stats, indent=2))
+
+
+# Export the functions
+__all__ = ["SiteCrawler", "crawl_site", "normalize_url"]
+
+if __name__ == "__main__":
+    main()
@@ -9,8 +9,9 @@ from pprint import pprint
 
 from tool_file_dir import list_directory
 from tool_file_contents import read_file_contents
+from tool_summarize_text import cached_summary
 
-import ollama
+import ollama_client
 
 @tool
 def sa_list_directory() -> str:
@@ -64,13 +65,20 @@ def sa_summarize_directory() -> str:
     """
     lst = list_directory()
     print(f"{lst=}")
-    response = ollama.chat(
-        model="llama3.2:latest",
-        messages=[
-            {"role": "system", "content": f"Consider the contents of the current directory: {lst}"},
-            {"role": "user", "content": "Summarize the contents of the current directory. Make an educated guess as to what the major purposes of each file is, given the file name."},
-        ],
-        #tools=[read_file_contents],
-    )
-
-    return f"Summary of directory:{response.message.content}\n"
+    system = f"Consider the contents of the current directory: {lst}"
+    instruction = "Summarize the contents of the current directory. Make an educated guess as to what the major purposes of each file is, given the file name."
+
+    def summarize() -> str:
+        response = ollama_client.chat(
+            model="llama3.2:latest",
+            messages=[
+                {"role": "system", "content": system},
+                {"role": "user", "content": instruction},
+            ],
+            #tools=[read_file_contents],
+        )
+        return response.message.content
+
+    # the listing is part of the cache key, so adding or removing files gives a fresh summary
+    summary = cached_summary(instruction, system, "", summarize, model="llama3.2:latest")
+    return f"Summary of directory:{summary}\n"
@@ -0,0 +1,249 @@
+"""
+Token estimation and context-fit checks for prompts sent to Ollama
+
+Ollama silently drops the start of a prompt that is longer than the model's
+num_ctx, after paying to evaluate it. The tools call fit_fields (or
+count_tokens / split_to_budget directly) before every chat call so an
+oversized prompt is trimmed, chunked or rejected instead, and every call's
+prompt size is logged and kept in prompt_token_stats() for sizing num_ctx.
+
+count_tokens is a regex approximation of a BPE tokenizer (one token per short
+word, number group or punctuation mark) scaled by a per-model factor that
+calibrate() fits from real token counts, e.g. Ollama's prompt_eval_count.
+"""
+
+import logging
+import math
+import os
+import re
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+DEFAULT_NUM_CTX = int(os.environ.get("OLLAMA_CONTEXT_LENGTH", 4096))  # the server's default context
+DEFAULT_RESERVE_TOKENS = 512  # room left for the model's reply
+MESSAGE_OVERHEAD_TOKENS = 4  # chat template tokens around each message
+CHARS_PER_TOKEN = 4.0  # average for English text, used when only a character count is known
+POLICIES = ("trim", "chunk", "raise")
+
+# words split into pieces of up to 8 letters, numbers into groups of 3 digits, other symbols one each
+_TOKEN_RE = re.compile(r"[^\W\d_]{1,8}|\d{1,3}|[^\w\s]|_")
+
+_context_lengths: Dict[str, int] = {}
+_calibration: Dict[str, float] = {}
+_stats: Dict[str, Dict[str, int]] = {}
+_lock = threading.Lock()
+
+
+class ContextOverflowError(ValueError):
+    """Raised when a prompt does not fit the model's context and the policy is "raise" """
+
+
+def _lookup(table: Dict[str, Any], model: Optional[str], default: Any) -> Any:
+    """Value for the exact model name, else for its family ("llama3.2" for "llama3.2:latest")"""
+    if model is None:
+        return default
+    if model in table:
+        return table[model]
+    return table.get(model.split(":")[0], default)
+
+
+def set_context_length(model: str, num_ctx: int):
+    """Record the num_ctx a model runs with (a name without a tag applies to every tag)"""
+    _context_lengths[model] = num_ctx
+
+
+def context_length(model: Optional[str]) -> int:
+    return _lookup(_context_lengths, model, DEFAULT_NUM_CTX)
+
+
+def calibrate(model: str, samples: Sequence[Tuple[str, int]]) -> float:
+    """
+    Fit the model's scaling factor from (text, actual token count) samples and
+    return it; later count_tokens(text, model) calls use it. Ollama's
+    prompt_eval_count leaves out a prefix reused from its KV cache, so take
+    samples from prompts that do not share a start with earlier ones.
+    """
+    estimated = sum(len(_TOKEN_RE.findall(text)) for text, _ in samples)
+    actual = sum(tokens for _, tokens in samples)
+    if estimated and actual:
+        _calibration[model] = actual / estimated
+    return _calibration.get(model, 1.0)
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """Approximate number of tokens in text for model"""
+    if not text:
+        return 0
+    return math.ceil(len(_TOKEN_RE.findall(text)) * _lookup(_calibration, model, 1.0))
+
+
+def tokens_for_chars(chars: int, model: Optional[str] = None) -> int:
+    """Cheaper estimate from a character count alone"""
+    return math.ceil(chars / CHARS_PER_TOKEN * _lookup(_calibration, model, 1.0))
+
+
+def count_message_tokens(messages: Sequence[Dict[str, str]], model: Optional[str] = None) -> int:
+    return sum(count_tokens(message.get("content", ""), model) + MESSAGE_OVERHEAD_TOKENS for message in messages)
+
+
+def split_to_budget(text: str, max_tokens: int, model: Optional[str] = None) -> List[str]:
+    """
+    Split text into chunks of at most max_tokens, breaking between paragraphs
+    where possible, then between sentences, then inside sentences
+    """
+    chunks: List[str] = []
+    current = ""
+    current_tokens = 0
+
+    def pack(piece: str, separator: str):
+        nonlocal current, current_tokens
+        tokens = count_tokens(piece, model)
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append(current)
+            current, current_tokens = "", 0
+        current = current + separator + piece if current else piece
+        current_tokens += tokens
+
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if count_tokens(paragraph, model) <= max_tokens:
+            pack(paragraph, "\n\n")
+            continue
+        for sentence in re.split(r"(?<=[.!?])\s+", paragraph):
+            if count_tokens(sentence, model) <= max_tokens:
+                pack(sentence, " ")
+            else:
+                for piece in _split_words(sentence, max_tokens, model):
+                    pack(piece, " ")
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _split_words(text: str, max_tokens: int, model: Optional[str]) -> List[str]:
+    """Split a long sentence between words (or inside very long words)"""
+    words = text.split(" ")
+    pieces, current = [], []
+    for word in words:
+        if current and count_tokens(" ".join(current + [word]), model) > max_tokens:
+            pieces.append(" ".join(current))
+            current = []
+        while count_tokens(word, model) > max_tokens:
+            cut = max(1, int(max_tokens * CHARS_PER_TOKEN / 2))
+            pieces.append(word[:cut])
+            word = word[cut:]
+        current.append(word)
+    if current:
+        pieces.append(" ".join(current))
+    return pieces
+
+
+def trim_to_budget(text: str, max_tokens: int, model: Optional[str] = None) -> str:
+    """
+    Shorten text to at most max_tokens (counting the trim marker) by cutting
+    out its middle, keeping the start and end where instructions and questions
+    usually are
+    """
+    tokens = count_tokens(text, model)
+    if tokens <= max_tokens:
+        return text
+    marker = f"\n[... {tokens} tokens trimmed ...]\n"  # at least as long as the real marker
+    budget = max_tokens - count_tokens(marker, model)
+    if budget <= 0:
+        return ""
+    keep_chars = int(len(text) * budget / tokens)
+    while True:
+        # cutting inside words can add a token or two, so shrink until the result fits
+        half = keep_chars // 2
+        trimmed = f"{text[:half]}\n[... {tokens - budget} tokens trimmed ...]\n{text[len(text) - half:] if half else ''}"
+        if not half or count_tokens(trimmed, model) <= max_tokens:
+            return trimmed
+        keep_chars = min(keep_chars - 2, int(keep_chars * 0.95))
+
+
+def record_prompt(model: str, tokens: int, label: str = "", num_ctx: Optional[int] = None,
+                  reported_tokens: Optional[int] = None):
+    """Log one call's prompt size and add it to prompt_token_stats()"""
+    num_ctx = num_ctx or context_length(model)
+    logging.info(f"{label or model}: ~{tokens} prompt tokens for {model} (num_ctx {num_ctx})")
+    with _lock:
+        stats = _stats.setdefault(model, {
+            "calls": 0, "prompt_tokens": 0, "max_prompt_tokens": 0, "over_context": 0,
+            "reported_prompt_tokens": 0,
+        })
+        stats["calls"] += 1
+        stats["prompt_tokens"] += tokens
+        stats["max_prompt_tokens"] = max(stats["max_prompt_tokens"], tokens)
+        stats["over_context"] += tokens > num_ctx
+        stats["reported_prompt_tokens"] += reported_tokens or 0
+
+
+def prompt_token_stats() -> Dict[str, Dict[str, int]]:
+    """Per model: calls, estimated prompt tokens (total and max), calls over num_ctx and
+    Ollama's reported prompt_eval_count total where the caller passed it"""
+    with _lock:
+        return {model: dict(stats) for model, stats in _stats.items()}
+
+
+def fit_fields(
+    model: str,
+    build: Callable[[Dict[str, str]], List[Dict[str, str]]],
+    fields: Dict[str, str],
+    trimmable: Sequence[str],
+    policy: str = "trim",
+    reserve_tokens: int = DEFAULT_RESERVE_TOKENS,
+    label: str = "",
+) -> List[Dict[str, str]]:
+    """
+    Build chat messages from fields and make sure they fit the model's context
+
+    Args:
+        model (str): model the messages are for
+        build: function turning the fields into the messages to send
+        fields (dict): the variable parts of the prompt
+        trimmable (list): names of fields that may be shortened, in the order to try
+        policy (str): "trim" shortens trimmable fields, "raise" raises ContextOverflowError
+        reserve_tokens (int): context left free for the reply
+        label (str): name logged with the prompt size
+
+    Returns:
+        the messages, trimmed if necessary
+    """
+    if policy not in ("trim", "raise"):
+        raise ValueError(f"Unsupported token policy for this prompt: {policy}")
+    limit = context_length(model) - reserve_tokens
+    messages = build(fields)
+    tokens = count_message_tokens(messages, model)
+    if tokens > limit:
+        if policy == "raise":
+            raise ContextOverflowError(
+                f"{label or model}: prompt of ~{tokens} tokens does not fit num_ctx "
+                f"{context_length(model)} with {reserve_tokens} reserved for the reply"
+            )
+        fields = dict(fields)
+        for _ in range(3):  # a field counted inside the prompt can come out a token or two longer
+            for name in trimmable:
+                excess = tokens - limit
+                if excess <= 0:
+                    break
+                field_tokens = count_tokens(fields[name], model)
+                fields[name] = trim_to_budget(fields[name], max(0, field_tokens - excess), model)
+                messages = build(fields)
+                tokens = count_message_tokens(messages, model)
+            if tokens <= limit:
+                break
+        if tokens > limit:
+            raise ContextOverflowError(f"{label or model}: prompt of ~{tokens} tokens cannot be trimmed to {limit}")
+        logging.warning(f"{label or model}: prompt trimmed to ~{tokens} tokens to fit num_ctx {context_length(model)}")
+    record_prompt(model, tokens, label)
+    return messages
+
+
+# Export the functions
+__all__ = [
+    "ContextOverflowError", "POLICIES", "count_tokens", "count_message_tokens", "tokens_for_chars",
+    "context_length", "set_context_length", "calibrate", "split_to_budget", "trim_to_budget",
+    "fit_fields", "record_prompt", "prompt_token_stats",
+]
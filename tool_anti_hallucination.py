@@ -6,8 +6,19 @@ from typing import Optional, Dict, Any
 from pathlib import Path
 from pprint import pprint
 import json
-from ollama import ChatResponse
-from ollama import chat
+from typing import TYPE_CHECKING
+import ollama_client
+from token_budget import fit_fields
+
+if TYPE_CHECKING:
+    from ollama import ChatResponse
+
+MODEL = "llama3.2:latest"
+TOKEN_POLICY = "trim"  # prompt longer than the model context: "trim" the context/output or "raise"
+# "prefix" sends the guidelines as an unchanging system prompt and the INPUT, CONTEXT and OUTPUT
+# after it, so Ollama reuses the guidelines' KV cache across calls; "inline" formats them into
+# the middle of the guidelines
+PROMPT_LAYOUT = "prefix"
 
 def read_anti_hallucination_template() -> str:
     """
@@ -18,7 +29,17 @@ def read_anti_hallucination_template() -> str:
         content = f.read()
         return content
 
+def prefix_template(template: str) -> str:
+    """
+    The template's instructions with its INPUT/CONTEXT/OUTPUT block taken out,
+    for the "prefix" layout, so both layouts share one set of guidelines
+    """
+    head, rest = template.split("INPUT:\n{input}", 1)
+    tail = rest.split("{output}", 1)[1]
+    return f"{head.rstrip()}\n\n{tail.strip()}\n".format()  # format() turns {{ }} back into braces
+
 TEMPLATE = read_anti_hallucination_template()
+PREFIX_TEMPLATE = prefix_template(TEMPLATE)
 
 def detect_hallucination(user_input: str, context: str, output: str) -> str:
     """
@@ -37,14 +58,22 @@ def detect_hallucination(user_input: str, context: str, output: str) -> str:
        ]
      }
     """
-    prompt = TEMPLATE.format(input=user_input, context=context, output=output)
-    response: ChatResponse = chat(
-        model="llama3.2:latest",
-        messages=[
-            {"role": "system", "content": prompt},
-            {"role": "user", "content": output},
-        ],
+    def build(fields: Dict[str, str]):
+        if PROMPT_LAYOUT == "prefix":
+            return [
+                {"role": "system", "content": PREFIX_TEMPLATE},
+                {"role": "user", "content": f"INPUT:\n{fields['input']}\n\nCONTEXT:\n{fields['context']}\n\nOUTPUT:\n{fields['output']}"},
+            ]
+        return [
+            {"role": "system", "content": TEMPLATE.format(**fields)},
+            {"role": "user", "content": fields["output"]},
+        ]
+
+    messages = fit_fields(
+        MODEL, build, {"input": user_input, "context": context, "output": output},
+        trimmable=["context", "output", "input"], policy=TOKEN_POLICY, label="detect_hallucination",
     )
+    response: "ChatResponse" = ollama_client.chat(model=MODEL, messages=messages)
     try:
         return json.loads(response.message.content)
     except json.JSONDecodeError:
@@ -8,9 +8,18 @@ import json
 import re
 from pprint import pprint
 
-import ollama
+import ollama_client
+from token_budget import fit_fields
+
+MODEL = "qwen2.5-coder:14b"  # "llama3.2:latest"
+TOKEN_POLICY = "trim"  # prompt longer than the model context: "trim" the results/prompt or "raise"
+# "prefix" puts the fixed instructions first and the prompt and results last, so Ollama reuses the
+# KV cache of the instructions (and of the prompt when judging several results for it); "inline"
+# puts the results first and the instructions after them
+PROMPT_LAYOUT = "prefix"
+INSTRUCTIONS = "Always judge this output for correctness."
+CHECK_INSTRUCTIONS = "Double check your work and explain your thinking in a few sentences. End your output with a Y or N answer"
 
-client = ollama.Client()
 
 def judge_results(original_prompt: str, llm_gen_results: str) -> Dict[str, str]:
     """
@@ -26,13 +35,24 @@ def judge_results(original_prompt: str, llm_gen_results: str) -> Dict[str, str]:
             - 'G': A Good result
     """
     try:
-        messages = [
-            {"role": "system", "content": "Always judge this output for correctness."},
-            {"role": "user", "content": f"Evaluate this output:\n\n{llm_gen_results}\n\nfor this prompt:\n\n{original_prompt}\n\nDouble check your work and explain your thinking in a few sentences. End your output with a Y or N answer"},
-        ]
+        def build(fields: Dict[str, str]):
+            if PROMPT_LAYOUT == "prefix":
+                return [
+                    {"role": "system", "content": f"{INSTRUCTIONS} {CHECK_INSTRUCTIONS}"},
+                    {"role": "user", "content": f"For this prompt:\n\n{fields['original_prompt']}\n\nevaluate this output:\n\n{fields['llm_gen_results']}"},
+                ]
+            return [
+                {"role": "system", "content": INSTRUCTIONS},
+                {"role": "user", "content": f"Evaluate this output:\n\n{fields['llm_gen_results']}\n\nfor this prompt:\n\n{fields['original_prompt']}\n\n{CHECK_INSTRUCTIONS}"},
+            ]
+
+        messages = fit_fields(
+            MODEL, build, {"original_prompt": original_prompt, "llm_gen_results": llm_gen_results},
+            trimmable=["llm_gen_results", "original_prompt"], policy=TOKEN_POLICY, label="judge_results",
+        )
 
-        response = client.chat(
-            model="qwen2.5-coder:14b", # "llama3.2:latest",
+        response = ollama_client.chat(
+            model=MODEL,
             messages=messages,
         )
 
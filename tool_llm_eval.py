@@ -1,7 +1,11 @@
 import json
 from typing import List, Dict, Optional, Iterator
-import ollama
 from ollama import GenerateResponse
+import ollama_client
+from token_budget import fit_fields
+
+TOKEN_POLICY = "trim"  # prompt longer than the model context: "trim" the conversation or "raise"
+SYSTEM_PROMPT = "You are an expert AI evaluator. Provide detailed, objective assessments in JSON format."
 
 
 def clean_json_response(response: str) -> str:
@@ -46,12 +50,13 @@ def evaluate_llm_conversation(
     ])
 
     # Create evaluation prompt
-    evaluation_prompt = f"""
+    def build(fields: Dict[str, str]):
+        evaluation_prompt = f"""
     Please evaluate the following conversation between a user and an AI assistant.
     Focus on these criteria: {', '.join(evaluation_criteria)}
 
     Conversation:
-    {formatted_chat}
+    {fields['formatted_chat']}
 
     Provide a structured evaluation with:
     1. Scores (1-10) for each criterion
@@ -61,13 +66,19 @@ def evaluate_llm_conversation(
 
     Format your response as JSON.
     """
+        return [{"role": "system", "content": SYSTEM_PROMPT}, {"role": "user", "content": evaluation_prompt}]
 
     try:
+        messages = fit_fields(
+            model, build, {"formatted_chat": formatted_chat},
+            trimmable=["formatted_chat"], policy=TOKEN_POLICY, label="evaluate_llm_conversation",
+        )
+
         # Get evaluation from Ollama
-        response: GenerateResponse | Iterator[GenerateResponse] = ollama.generate(
+        response: GenerateResponse | Iterator[GenerateResponse] = ollama_client.generate(
             model=model,
-            prompt=evaluation_prompt,
-            system="You are an expert AI evaluator. Provide detailed, objective assessments in JSON format."
+            prompt=messages[1]["content"],
+            system=messages[0]["content"]
         )
 
         response_clean: str = clean_json_response(response['response'])
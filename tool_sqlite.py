@@ -1,51 +1,305 @@
+import asyncio
+import csv
 import sqlite3
 import json
-from typing import Dict, Any, List, Optional
-import ollama
+import hashlib
+import math
+import queue
+import threading
+import time
+from collections import Counter
+from itertools import chain, islice
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Sequence, Tuple
 from functools import wraps
 import re
 from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from textwrap import dedent # for multi-line string literals
 
+import ollama_client
+from caching import LRUCache, TieredCache
+from token_budget import count_tokens, record_prompt
+
 class DatabaseError(Exception):
     """Custom exception for database operations"""
     pass
 
 
-def _create_sample_data(cursor):  # Helper function to create sample data
-    """Create sample data for tables"""
-    sample_data = {
-        'example': [
+# Sample data for tables: table -> (columns, records)
+SAMPLE_DATA = {
+    'example': (
+        ('name', 'value'),
+        [
             ('Example 1', 10.5),
             ('Example 2', 25.0)
-        ],
-        'users': [
+        ]
+    ),
+    'users': (
+        ('name', 'email'),
+        [
             ('Bob', 'bob@example.com'),
             ('Susan', 'susan@test.net')
-        ],
-        'products': [
+        ]
+    ),
+    'products': (
+        ('product_name', 'price'),
+        [
             ('Laptop', 1200.00),
             ('Keyboard', 75.50)
         ]
-    }
-
-    for table, data in sample_data.items():
-        for record in data:
-            if table == 'example':
-                cursor.execute(
-                    "INSERT INTO example (name, value) VALUES (?, ?) ON CONFLICT DO NOTHING",
-                    record
-                )
-            elif table == 'users':
-                cursor.execute(
-                    "INSERT INTO users (name, email) VALUES (?, ?) ON CONFLICT DO NOTHING",
-                    record
-                )
-            elif table == 'products':
-                cursor.execute(
-                    "INSERT INTO products (product_name, price) VALUES (?, ?) ON CONFLICT DO NOTHING",
-                    record
+    )
+}
+
+
+def _quote_identifier(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _row_size(row: tuple) -> int:
+    """Approximate the in-memory payload size of a result row in bytes"""
+    size = 0
+    for value in row:
+        if isinstance(value, (str, bytes)):
+            size += len(value)
+        else:
+            size += 8
+    return size
+
+
+_SQL_TOKEN_RE = re.compile(r"""('(?:[^']|'')*'|"(?:[^"]|"")*")|\s+""")
+_WRITE_RE = re.compile(r"\b(INSERT|UPDATE|DELETE|REPLACE|CREATE|DROP|ALTER|ATTACH|DETACH|VACUUM|PRAGMA)\b", re.I)
+_NONDETERMINISTIC_RE = re.compile(
+    r"\b(random|randomblob|changes|total_changes|last_insert_rowid|current_date|current_time|current_timestamp)\b|'now'",
+    re.I,
+)
+
+
+def _normalize_sql(query: str) -> str:
+    """Collapse whitespace outside string literals and drop a trailing semicolon"""
+    normalized = _SQL_TOKEN_RE.sub(lambda m: m.group(1) or " ", query).strip()
+    return normalized.rstrip(";").strip()
+
+
+def _is_select(query: str) -> bool:
+    """True for read-only SELECT / WITH / VALUES statements"""
+    return bool(re.match(r"\s*(SELECT|WITH|VALUES)\b", query, re.I)) and not _WRITE_RE.search(query)
+
+
+def _is_cacheable(query: str) -> bool:
+    """True for deterministic read-only SELECT / WITH / VALUES statements"""
+    return _is_select(query) and not _NONDETERMINISTIC_RE.search(query)
+
+
+def _subquery(query: str) -> str:
+    """
+    A SELECT as a parenthesized subquery, without its final semicolon; the
+    newlines keep a trailing -- comment from swallowing the closing parenthesis
+    """
+    query = re.sub(r";(?=(\s*--[^\n]*)*\s*$)", "", query.strip())
+    return f"(\n{query}\n)"
+
+
+def _with_offset(query: str, offset: int) -> str:
+    """Wrap a SELECT so that its first offset rows are skipped"""
+    if not offset:
+        return query
+    return f"SELECT * FROM {_subquery(query)} LIMIT -1 OFFSET {int(offset)}"
+
+
+def _fetch_batches(cursor, batch_size: int, max_rows: Optional[int], max_bytes: Optional[int]):
+    """Yield fetchmany() batches from an executed cursor until a row or byte limit is hit"""
+    rows_seen = 0
+    bytes_seen = 0
+    while True:
+        size = batch_size
+        if max_rows is not None:
+            size = min(size, max_rows - rows_seen)
+            if size <= 0:
+                return
+        batch = cursor.fetchmany(size)
+        if not batch:
+            return
+        if max_bytes is not None:
+            for i, row in enumerate(batch):
+                bytes_seen += _row_size(row)
+                if bytes_seen > max_bytes:
+                    if i:
+                        yield batch[:i]
+                    return
+        rows_seen += len(batch)
+        yield batch
+
+
+_SQL_KEYWORDS = {
+    "where", "on", "using", "join", "left", "right", "inner", "outer", "cross", "natural",
+    "group", "order", "limit", "having", "union", "except", "intersect", "window", "as",
+}
+
+
+class QueryPlanGuard:
+    """
+    Checks SELECT statements with EXPLAIN QUERY PLAN before they are executed
+
+    The cost estimate multiplies the estimated rows visited by each nested loop
+    (a SCAN visits the whole table, a SEARCH about log2 of it) and adds a
+    penalty for temporary B-tree sorts. Queries over max_cost are rejected
+    (policy="reject") or wrapped in a LIMIT of row_limit rows (policy="limit";
+    sorts and Cartesian products are still rejected because a LIMIT does not
+    make them cheaper). Full scans filtered by a WHERE clause are logged, and
+    with auto_index=True a covering index is created once the same scan has
+    been seen index_threshold times.
+    """
+
+    def __init__(
+        self,
+        max_cost: float = 1_000_000,
+        policy: str = "limit",
+        row_limit: int = 1000,
+        auto_index: bool = False,
+        index_threshold: int = 3,
+    ):
+        if policy not in ("limit", "reject"):
+            raise ValueError(f"Unknown plan guard policy: {policy}")
+        self.max_cost = max_cost
+        self.policy = policy
+        self.row_limit = row_limit
+        self.auto_index = auto_index
+        self.index_threshold = index_threshold
+        self.stats = Counter()
+        self.scan_predicates = Counter()  # (table, (columns...)) -> times seen in a full scan
+        self._lock = threading.Lock()
+
+    def check(self, conn: sqlite3.Connection, query: str, offset: int = 0) -> str:
+        """
+        Return the query to execute, with its first offset rows skipped and
+        possibly with a LIMIT added; raise DatabaseError to reject it
+        """
+        plan = conn.execute(f"EXPLAIN QUERY PLAN {query}").fetchall()
+        tables = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+        aliases = _table_aliases(query, tables)
+        cost, sorts, scans = self._estimate_cost(conn, plan, aliases)
+        with self._lock:
+            self.stats["planned"] += 1
+
+        for table in scans:
+            self._log_scan(conn, query, table)
+
+        if cost > self.max_cost:
+            details = "; ".join(row[3] for row in plan)
+            if self.policy == "reject" or sorts or len(scans) > 1:
+                with self._lock:
+                    self.stats["rejected"] += 1
+                raise DatabaseError(
+                    f"Query rejected: estimated cost {cost:.0f} exceeds budget {self.max_cost:.0f} ({details})"
                 )
+            limit = re.search(r"\bLIMIT\s+(\d+)\s*;?\s*$", query, re.I)
+            if limit is None or int(limit.group(1)) > self.row_limit:
+                with self._lock:
+                    self.stats["rewritten"] += 1
+                    self.stats["executed"] += 1
+                # one wrap, so the row budget applies to the rows after the offset
+                return f"SELECT * FROM {_subquery(query)} LIMIT {self.row_limit} OFFSET {int(offset)}"
+
+        with self._lock:
+            self.stats["executed"] += 1
+        return _with_offset(query, offset)
+
+    def _estimate_cost(self, conn, plan, aliases):
+        loops: Dict[int, float] = {}  # parent id -> product of rows visited by its nested loops
+        extra = 0.0
+        sorts = 0
+        scans = []
+        for _, parent, _, detail in plan:
+            match = re.match(r"(SCAN|SEARCH) (\S+)", detail)
+            if match:
+                table = aliases.get(match.group(2).lower())
+                rows = _estimated_rows(conn, table) if table else 1
+                if match.group(1) == "SCAN":
+                    factor = rows
+                    if table and " INDEX " not in detail:
+                        scans.append(table)
+                else:
+                    factor = math.log2(rows + 1) + 1
+                    if "AUTOMATIC" in detail:
+                        extra += rows  # the transient index is built from a full scan
+                loops[parent] = loops.get(parent, 1.0) * factor
+            elif "TEMP B-TREE" in detail:
+                sorts += 1
+        cost = sum(loops.values()) + extra
+        if sorts:
+            cost += sorts * cost * math.log2(cost + 2)
+        return cost, sorts, scans
+
+    def _log_scan(self, conn, query: str, table: str):
+        """Count WHERE columns of a full table scan and create an index when they keep recurring"""
+        where = re.search(r"\bWHERE\b(.*?)(\bGROUP\b|\bORDER\b|\bLIMIT\b|$)", query, re.I | re.S)
+        if not where:
+            return
+        columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table});")]
+        lower = {column.lower(): column for column in columns}
+        predicate = []
+        for name in re.findall(r"(?:\w+\.)?(\w+)\s*(?:=|<|>|!=|\bIN\b|\bLIKE\b|\bBETWEEN\b)", where.group(1), re.I):
+            column = lower.get(name.lower())
+            if column and column not in predicate:
+                predicate.append(column)
+        if not predicate:
+            return
+        key = (table, tuple(predicate))
+        with self._lock:
+            self.scan_predicates[key] += 1
+            seen = self.scan_predicates[key]
+        if self.auto_index and seen == self.index_threshold:
+            self._create_index(conn, query, table, predicate, lower)
+
+    def _create_index(self, conn, query: str, table: str, predicate: List[str], lower: Dict[str, str]):
+        # append the selected columns so the index covers the query when it can
+        indexed = list(predicate)
+        projection = re.match(r"\s*SELECT\s+(.*?)\s+FROM\b", query, re.I | re.S)
+        if projection:
+            for name in projection.group(1).split(","):
+                column = lower.get(name.strip().split(".")[-1].lower())
+                if column and column not in indexed:
+                    indexed.append(column)
+        name = f"auto_idx_{table}_" + "_".join(predicate)
+        try:
+            conn.execute(f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" ({", ".join(indexed)});')
+        except sqlite3.Error:  # e.g. a query_only connection; retried when the scan is seen again
+            with self._lock:
+                self.scan_predicates[(table, tuple(predicate))] -= 1
+            return
+        with self._lock:
+            self.stats["indexes_created"] += 1
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **{key: self.stats[key] for key in ("planned", "rejected", "rewritten", "executed", "indexes_created")},
+                "top_scan_predicates": [
+                    {"table": table, "columns": list(columns), "count": count}
+                    for (table, columns), count in self.scan_predicates.most_common(10)
+                ],
+            }
+
+
+def _table_aliases(query: str, tables: set) -> Dict[str, str]:
+    """Map lowercase table names and their aliases in a query to table names"""
+    aliases = {table.lower(): table for table in tables}
+    lower = {table.lower(): table for table in tables}
+    for name, alias in re.findall(
+        r"(?:\bFROM|\bJOIN|,)\s*([A-Za-z_]\w*)(?:\s+(?:AS\s+)?([A-Za-z_]\w*))?", query, re.I
+    ):
+        table = lower.get(name.lower())
+        if table and alias and alias.lower() not in _SQL_KEYWORDS:
+            aliases[alias.lower()] = table
+    return aliases
+
+
+def _estimated_rows(conn: sqlite3.Connection, table: str) -> int:
+    """Cheap row count estimate: max(rowid) is an O(log n) lookup"""
+    try:
+        return conn.execute(f'SELECT max(rowid) FROM "{table}"').fetchone()[0] or 0
+    except sqlite3.Error:  # WITHOUT ROWID table
+        return conn.execute(f'SELECT count(*) FROM "{table}"').fetchone()[0]
 
 
 class SQLiteTool:
@@ -56,20 +310,114 @@ class SQLiteTool:
             cls._instance = super(SQLiteTool, cls).__new__(cls)
         return cls._instance
 
-    def __init__(self, default_db: str = "test.db"):
+    def __init__(
+        self,
+        default_db: str = "test.db",
+        pooled: bool = False,
+        pool_size: int = 8,
+        cache_size: int = -16000,
+        mmap_size: int = 256 * 1024 * 1024,
+        synchronous: str = "NORMAL",
+        result_cache_entries: int = 0,
+        result_cache_bytes: int = 64 * 1024 * 1024,
+        plan_guard: Optional["QueryPlanGuard"] = None,
+    ):
+        """
+        Args:
+            default_db (str): path to the SQLite database file
+            pooled (bool): reuse a bounded pool of persistent WAL-mode connections
+                instead of opening and closing a connection for every call
+            pool_size (int): maximum number of pooled connections
+            cache_size (int): PRAGMA cache_size for pooled connections (negative values are KiB)
+            mmap_size (int): PRAGMA mmap_size in bytes for pooled connections
+            synchronous (str): PRAGMA synchronous for pooled connections (OFF, NORMAL, FULL)
+            result_cache_entries (int): number of read query results to cache (0 disables the cache)
+            result_cache_bytes (int): approximate maximum size of all cached results
+            plan_guard (QueryPlanGuard): optional EXPLAIN QUERY PLAN check run before each SELECT
+        """
         if hasattr(self, 'default_db'):  # Skip initialization if already done
             return
         self.default_db = default_db
+        self.pooled = pooled
+        self.pool_size = pool_size
+        self.pragmas = {
+            "cache_size": cache_size,
+            "mmap_size": mmap_size,
+            "synchronous": synchronous,
+        }
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        self._pool_lock = threading.Lock()
+        self._pool_created = 0
+        self._schema_version = None
+        self._schema_fingerprint = None
+        self.plan_guard = plan_guard
+        self.result_cache = None
+        if result_cache_entries > 0:
+            self.result_cache = LRUCache(result_cache_entries, result_cache_bytes)
+            # PRAGMA data_version on a connection only changes when *other*
+            # connections commit, so a dedicated watcher sees every write
+            self._version_conn = sqlite3.connect(default_db, check_same_thread=False)
+            self._version_lock = threading.Lock()
+            self._cached_data_version = None
         self._initialize_database()
 
+    def _open_pooled_connection(self) -> sqlite3.Connection:
+        """Open a long-lived connection configured for concurrent readers"""
+        conn = sqlite3.connect(self.default_db, check_same_thread=False, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL;")
+        conn.execute("PRAGMA busy_timeout=30000;")
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name}={value};")
+        return conn
+
+    def _acquire_connection(self) -> sqlite3.Connection:
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            pass
+        with self._pool_lock:
+            if self._pool_created < self.pool_size:
+                self._pool_created += 1
+                create = True
+            else:
+                create = False
+        if create:
+            try:
+                return self._open_pooled_connection()
+            except sqlite3.Error:
+                with self._pool_lock:
+                    self._pool_created -= 1
+                raise
+        return self._pool.get()  # block until another caller releases one
+
     @contextmanager
     def get_connection(self):
         """Context manager for database connections"""
-        conn = sqlite3.connect(self.default_db)
+        if not self.pooled:
+            conn = sqlite3.connect(self.default_db)
+            try:
+                yield conn
+            finally:
+                conn.close()
+            return
+
+        conn = self._acquire_connection()
         try:
             yield conn
         finally:
+            conn.rollback()  # same semantics as close(): uncommitted work is discarded
+            self._pool.put(conn)
+
+    def close_pool(self):
+        """Close all idle pooled connections"""
+        while True:
+            try:
+                conn = self._pool.get_nowait()
+            except queue.Empty:
+                break
             conn.close()
+            with self._pool_lock:
+                self._pool_created -= 1
 
     def _initialize_database(self):
         """Initialize database with tables"""
@@ -102,8 +450,111 @@ class SQLiteTool:
             for table_sql in tables.values():
                 cursor.execute(table_sql)
             conn.commit()
-            _create_sample_data(cursor)
-            conn.commit()
+
+        for table, (columns, records) in SAMPLE_DATA.items():
+            self.bulk_insert(table, columns, records)
+
+    def bulk_insert(
+        self,
+        table: str,
+        columns: Sequence[str],
+        rows: Iterable[Sequence[Any]],
+        chunk_size: int = 10000,
+    ) -> Dict[str, Any]:
+        """
+        Insert rows with executemany() in a single transaction
+
+        rows may be any iterable (for example a generator reading a file); it is
+        consumed chunk_size rows at a time. While loading, synchronous is turned
+        off and the page cache enlarged; both are restored afterwards. Rows that
+        violate a constraint are skipped (ON CONFLICT DO NOTHING).
+
+        Returns:
+            dict with table, rows, inserted, seconds and rows_per_sec
+        """
+        sql = (
+            f"INSERT INTO {_quote_identifier(table)} ({', '.join(_quote_identifier(c) for c in columns)}) "
+            f"VALUES ({', '.join('?' for _ in columns)}) ON CONFLICT DO NOTHING"
+        )
+        start = time.perf_counter()
+        total = 0
+        with self.get_connection() as conn:
+            saved = {
+                name: conn.execute(f"PRAGMA {name};").fetchone()[0]
+                for name in ("synchronous", "cache_size", "temp_store")
+            }
+            conn.execute("PRAGMA synchronous=OFF;")
+            conn.execute("PRAGMA cache_size=-262144;")
+            conn.execute("PRAGMA temp_store=MEMORY;")
+            changes_before = conn.total_changes
+            try:
+                conn.execute("BEGIN")
+                iterator = iter(rows)
+                while True:
+                    chunk = list(islice(iterator, chunk_size))
+                    if not chunk:
+                        break
+                    conn.executemany(sql, chunk)
+                    total += len(chunk)
+                conn.commit()
+            except sqlite3.Error as e:
+                conn.rollback()
+                raise DatabaseError(f"Bulk insert into {table} failed: {str(e)}")
+            finally:
+                for name, value in saved.items():
+                    conn.execute(f"PRAGMA {name}={value};")
+            inserted = conn.total_changes - changes_before
+
+        seconds = time.perf_counter() - start
+        return {
+            "table": table,
+            "rows": total,
+            "inserted": inserted,
+            "seconds": seconds,
+            "rows_per_sec": total / seconds if seconds > 0 else 0.0,
+        }
+
+    def load_csv(
+        self,
+        path: str,
+        table: str,
+        columns: Optional[Sequence[str]] = None,
+        chunk_size: int = 10000,
+        delimiter: str = ",",
+    ) -> Dict[str, Any]:
+        """
+        Stream a CSV file into a table with bulk_insert
+
+        If columns is not given the first line of the file is used as the header.
+        """
+        with open(path, newline="", encoding="utf-8") as f:
+            reader = csv.reader(f, delimiter=delimiter)
+            if columns is None:
+                columns = next(reader)
+            return self.bulk_insert(table, columns, reader, chunk_size)
+
+    def load_jsonl(
+        self,
+        path: str,
+        table: str,
+        columns: Optional[Sequence[str]] = None,
+        chunk_size: int = 10000,
+    ) -> Dict[str, Any]:
+        """
+        Stream a JSON Lines file (one object per line) into a table with bulk_insert
+
+        If columns is not given the keys of the first object are used; missing
+        keys are inserted as NULL.
+        """
+        with open(path, encoding="utf-8") as f:
+            objects = (json.loads(line) for line in f if line.strip())
+            first = next(objects, None)
+            if first is None:
+                return self.bulk_insert(table, columns or [], [], chunk_size)
+            if columns is None:
+                columns = list(first)
+            rows = (tuple(obj.get(c) for c in columns) for obj in chain([first], objects))
+            return self.bulk_insert(table, columns, rows, chunk_size)
 
     def get_tables(self) -> List[str]:
         """Get list of tables in the database"""
@@ -112,6 +563,23 @@ class SQLiteTool:
             cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
             return [table[0] for table in cursor.fetchall()]
 
+    def schema_fingerprint(self) -> str:
+        """
+        Hash of the database schema taken from sqlite_master
+
+        PRAGMA schema_version is checked first so the hash is only recomputed
+        after the schema has actually changed.
+        """
+        with self.get_connection() as conn:
+            version = conn.execute("PRAGMA schema_version;").fetchone()[0]
+            if version != self._schema_version or self._schema_fingerprint is None:
+                rows = conn.execute(
+                    "SELECT type, name, tbl_name, sql FROM sqlite_master ORDER BY type, name;"
+                ).fetchall()
+                self._schema_fingerprint = hashlib.sha256(repr(rows).encode("utf-8")).hexdigest()
+                self._schema_version = version
+            return self._schema_fingerprint
+
     def get_table_schema(self, table_name: str) -> List[tuple]:
         """Get schema for a specific table"""
         with self.get_connection() as conn:
@@ -121,19 +589,307 @@ class SQLiteTool:
 
     def execute_query(self, query: str) -> List[tuple]:
         """Execute a SQL query and return results"""
+        cache_key = None
+        if self.result_cache is not None and _is_cacheable(query):
+            cache_key = _normalize_sql(query)
+            version = self._check_data_version()
+            rows = self.result_cache.get(cache_key)
+            if rows is not None:
+                return list(rows)
+
         with self.get_connection() as conn:
             cursor = conn.cursor()
             try:
-                cursor.execute(query)
-                return cursor.fetchall()
+                cursor.execute(self._guard(conn, query))
+                rows = cursor.fetchall()
             except sqlite3.Error as e:
                 raise DatabaseError(f"Query execution failed: {str(e)}")
 
+        if cache_key is not None:
+            with self._version_lock:
+                # a commit while the query ran may have been cleared already, so these rows could be stale
+                if self._version_conn.execute("PRAGMA data_version;").fetchone()[0] == version:
+                    # a tuple, so callers changing the list they get back cannot change later hits
+                    self.result_cache.put(cache_key, tuple(rows), sum(_row_size(row) for row in rows))
+        return rows
+
+    def _guard(self, conn: sqlite3.Connection, query: str, offset: int = 0) -> str:
+        """Run the plan guard (if any) and return the query to execute, skipping offset rows"""
+        if self.plan_guard is None or not _is_select(query):
+            return _with_offset(query, offset)
+        return self.plan_guard.check(conn, query, offset)
+
+    def plan_stats(self) -> Dict[str, Any]:
+        """Planned / rejected / rewritten / executed counts from the plan guard"""
+        return self.plan_guard.report() if self.plan_guard is not None else {}
+
+    def _check_data_version(self) -> int:
+        """Drop all cached results if any connection has committed since the last check; returns the version"""
+        with self._version_lock:
+            version = self._version_conn.execute("PRAGMA data_version;").fetchone()[0]
+            if version != self._cached_data_version:
+                self.result_cache.clear()
+                self._cached_data_version = version
+            return version
+
+    def result_cache_stats(self) -> Dict[str, int]:
+        """Hit/miss counters and size of the query result cache"""
+        return self.result_cache.stats() if self.result_cache is not None else {}
+
+    def iter_query(
+        self,
+        query: str,
+        batch_size: int = 500,
+        max_rows: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        offset: int = 0,
+    ) -> Iterator[List[tuple]]:
+        """
+        Execute a SQL query and yield rows in batches of at most batch_size
+
+        Iteration stops once max_rows rows or roughly max_bytes bytes of row data
+        have been produced. A non-zero offset skips that many rows of a SELECT,
+        so a caller can resume from offset + rows already seen.
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(self._guard(conn, query, offset))
+                yield from _fetch_batches(cursor, batch_size, max_rows, max_bytes)
+            except sqlite3.Error as e:
+                raise DatabaseError(f"Query execution failed: {str(e)}")
+            finally:
+                cursor.close()
+
+    def execute_query_columnar(
+        self,
+        query: str,
+        batch_size: int = 500,
+        max_rows: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        offset: int = 0,
+    ) -> Dict[str, list]:
+        """
+        Execute a SQL query and return a dict mapping column names to lists of values
+
+        Takes the same limits as iter_query. Each column list can be handed
+        directly to numpy.asarray or pandas.DataFrame.
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(self._guard(conn, query, offset))
+                names = [column[0] for column in cursor.description or []]
+                columns = {name: [] for name in names}
+                for batch in _fetch_batches(cursor, batch_size, max_rows, max_bytes):
+                    for name, values in zip(names, zip(*batch)):
+                        columns[name].extend(values)
+                return columns
+            except sqlite3.Error as e:
+                raise DatabaseError(f"Query execution failed: {str(e)}")
+            finally:
+                cursor.close()
+
+def _name_tokens(text: str) -> List[str]:
+    """Split identifiers and questions into lowercase word tokens with a crude singular form"""
+    text = re.sub(r"([a-z])([A-Z])", r"\1 \2", text)
+    tokens = []
+    for word in re.findall(r"[A-Za-z0-9]+", text.lower()):
+        if word.isdigit():
+            continue
+        tokens.append(word)
+        if len(word) > 3 and word.endswith("s"):
+            tokens.append(word[:-1])
+    return tokens
+
+
+class SchemaIndex:
+    """
+    Lexical index over table and column names used to select the tables relevant to a question
+
+    The index is rebuilt only when SQLiteTool.schema_fingerprint() changes.
+    """
+
+    def __init__(self, sqlite_tool: "SQLiteTool"):
+        self.sqlite_tool = sqlite_tool
+        self._fingerprint = None
+        self._ddl: Dict[str, str] = {}
+        self._tokens: Dict[str, Counter] = {}
+        self._idf: Dict[str, float] = {}
+
+    def refresh(self):
+        fingerprint = self.sqlite_tool.schema_fingerprint()
+        if fingerprint == self._fingerprint:
+            return
+        ddl, tokens = {}, {}
+        for table in self.sqlite_tool.get_tables():
+            if table.startswith("sqlite_"):
+                continue
+            columns = self.sqlite_tool.get_table_schema(table)
+            ddl[table] = f"{table}(" + ", ".join(
+                f"{name} {col_type}{' PRIMARY KEY' if pk else ''}".rstrip()
+                for _, name, col_type, _, _, pk in columns
+            ) + ")"
+            counts = Counter(_name_tokens(table) * 2)  # table names weigh more than columns
+            for column in columns:
+                counts.update(_name_tokens(column[1]))
+            tokens[table] = counts
+        document_frequency = Counter(token for counts in tokens.values() for token in counts)
+        self._idf = {
+            token: math.log((len(tokens) + 1) / (df + 1)) + 1
+            for token, df in document_frequency.items()
+        }
+        self._ddl, self._tokens = ddl, tokens
+        self._fingerprint = fingerprint
+
+    def search(self, question: str, top_k: int = 5) -> List[str]:
+        """
+        Return up to top_k table names ranked by overlap with the question; when
+        no table shares a word with it, the first top_k tables in schema order
+        """
+        self.refresh()
+        if len(self._ddl) <= top_k:
+            return list(self._ddl)
+        words = set(_name_tokens(question))
+        scores = {
+            table: sum(counts[word] * self._idf[word] for word in words if word in counts)
+            for table, counts in self._tokens.items()
+        }
+        ranked = sorted(scores, key=lambda table: scores[table], reverse=True)
+        if not scores[ranked[0]]:
+            return ranked[:top_k]  # sorted() is stable, so this keeps schema order
+        return [table for table in ranked[:top_k] if scores[table] > 0]
+
+    def tables(self) -> List[str]:
+        self.refresh()
+        return list(self._ddl)
+
+    def ddl(self, tables: Optional[List[str]] = None) -> str:
+        """Compact one-line-per-table DDL for the given tables (all tables by default)"""
+        self.refresh()
+        return "\n".join(self._ddl[table] for table in (tables if tables is not None else self._ddl))
+
+
+class AsyncSQLiteTool:
+    """
+    asyncio facade over SQLiteTool that keeps blocking SQLite calls off the event loop
+
+    Read-only statements run on read_connections worker threads, each with its
+    own persistent query_only connection; all other statements run on a single
+    writer thread and are committed. A per-query timeout and task cancellation
+    both interrupt the running statement through a SQLite progress handler.
+    """
+
+    def __init__(self, sqlite_tool: Optional["SQLiteTool"] = None, read_connections: int = 4):
+        self.sqlite_tool = sqlite_tool or SQLiteTool()
+        self._readers = ThreadPoolExecutor(max_workers=read_connections, thread_name_prefix="sqlite-read")
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite-write")
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+
+    def _connection(self, read_only: bool) -> sqlite3.Connection:
+        """Each worker thread owns one connection for its lifetime"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self.sqlite_tool._open_pooled_connection()
+            if read_only:
+                conn.execute("PRAGMA query_only=ON;")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def _execute(self, query: str, params: tuple, read_only: bool,
+                 deadline: Optional[float], cancelled: threading.Event) -> List[tuple]:
+        def interrupted() -> bool:
+            return cancelled.is_set() or (deadline is not None and time.monotonic() > deadline)
+
+        if interrupted():  # cancelled or timed out while waiting for a worker
+            raise DatabaseError("Query cancelled" if cancelled.is_set() else "Query timed out")
+        conn = self._connection(read_only)
+        conn.set_progress_handler(lambda: 1 if interrupted() else 0, 1000)
+        try:
+            rows = conn.execute(self.sqlite_tool._guard(conn, query), params).fetchall()
+            if not read_only:
+                conn.commit()
+            return rows
+        except sqlite3.Error as e:
+            if not read_only:
+                conn.rollback()
+            if interrupted():
+                raise DatabaseError("Query cancelled" if cancelled.is_set() else "Query timed out")
+            raise DatabaseError(f"Query execution failed: {str(e)}")
+        finally:
+            conn.set_progress_handler(None, 0)
+
+    async def _submit(self, query: str, params: tuple = (), read_only: Optional[bool] = None,
+                      timeout: Optional[float] = None) -> List[tuple]:
+        if read_only is None:
+            read_only = _is_select(query)
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        cancelled = threading.Event()
+        executor = self._readers if read_only else self._writer
+        future = asyncio.get_running_loop().run_in_executor(
+            executor, self._execute, query, params, read_only, deadline, cancelled
+        )
+        try:
+            return await future
+        except asyncio.CancelledError:
+            cancelled.set()  # stop the statement if it is already running
+            raise
+
+    async def aexecute_query(self, query: str, timeout: Optional[float] = None) -> List[tuple]:
+        """Execute a SQL query and return results; raises DatabaseError on timeout"""
+        return await self._submit(query, timeout=timeout)
+
+    async def aget_tables(self) -> List[str]:
+        """Get list of tables in the database"""
+        rows = await self._submit("SELECT name FROM sqlite_master WHERE type='table';", read_only=True)
+        return [table[0] for table in rows]
+
+    async def aget_table_schema(self, table_name: str) -> List[tuple]:
+        """Get schema for a specific table"""
+        return await self._submit(f"PRAGMA table_info({table_name});", read_only=True)
+
+    def close(self):
+        self._readers.shutdown(wait=True)
+        self._writer.shutdown(wait=True)
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+
+
 class OllamaFunctionCaller:
-    def __init__(self, model: str = "llama3.2:latest"):
+    def __init__(
+        self,
+        model: str = "llama3.2:latest",
+        max_rows: int = 1000,
+        max_bytes: int = 8 * 1024 * 1024,
+        cache_size: int = 256,
+        cache_path: Optional[str] = None,
+        schema_top_k: int = 5,
+    ):
+        """
+        Args:
+            model (str): Ollama model used to translate requests into function calls
+            max_rows (int): maximum number of rows returned for a query_database call
+            max_bytes (int): approximate maximum size of row data returned for a query_database call
+            cache_size (int): number of translated requests kept in memory (0 disables the cache)
+            cache_path (str): optional SQLite file used as a persistent second cache tier
+            schema_top_k (int): number of relevant tables whose DDL is included in the prompt
+        """
         self.model = model
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
         self.sqlite_tool = SQLiteTool()
         self.function_definitions = self._get_function_definitions()
+        self.translation_cache = TieredCache(max_entries=cache_size, disk_path=cache_path)
+        self._cached_fingerprint = None
+        self.schema_index = SchemaIndex(self.sqlite_tool)
+        self.schema_top_k = schema_top_k
+        self.last_prompt_stats: Dict[str, int] = {}  # estimated prompt tokens before/after table selection
 
     def _get_function_definitions(self) -> Dict:
         return {
@@ -159,11 +915,16 @@ class OllamaFunctionCaller:
             }
         }
 
-    def _generate_prompt(self, user_input: str) -> str:
+    def _generate_prompt(self, user_input: str, tables: Optional[List[str]] = None) -> str:
+        if tables is None:
+            tables = self.schema_index.search(user_input, self.schema_top_k)
         prompt = dedent(f"""
             You are a SQL assistant. Based on the user's request, generate a JSON response that calls the appropriate function.
             Available functions: {json.dumps(self.function_definitions, indent=2)}
 
+            Relevant database tables:
+            {self.schema_index.ddl(tables)}
+
             User request: {user_input}
 
             Respond with a JSON object containing:
@@ -172,6 +933,17 @@ class OllamaFunctionCaller:
 
             Response:
         """).strip()
+
+        # compare with what pasting every table's DDL would have cost
+        skipped_ddl = self.schema_index.ddl([t for t in self.schema_index.tables() if t not in tables])
+        prompt_tokens = count_tokens(prompt, self.model)
+        self.last_prompt_stats = {
+            "tables_total": len(self.schema_index.tables()),
+            "tables_selected": len(tables),
+            "prompt_tokens": prompt_tokens,
+            "full_schema_prompt_tokens": prompt_tokens + count_tokens(skipped_ddl, self.model),
+        }
+        record_prompt(self.model, prompt_tokens, "sql_translation")
         return prompt
 
     def _parse_ollama_response(self, response: str) -> Dict[str, Any]:
@@ -183,20 +955,140 @@ class OllamaFunctionCaller:
         except json.JSONDecodeError as e:
             raise ValueError(f"Invalid JSON in response: {str(e)}")
 
-    def process_request(self, user_input: str) -> Any:
-        try:
-            response = ollama.generate(model=self.model, prompt=self._generate_prompt(user_input))
-            function_call = self._parse_ollama_response(response.response)
+    def _cache_key(self, user_input: str) -> str:
+        """Key a request on its normalized text, the model and the current schema"""
+        fingerprint = self.sqlite_tool.schema_fingerprint()
+        if fingerprint != self._cached_fingerprint:
+            # entries for the old schema can never match again
+            self.translation_cache.clear(memory_only=True)
+            self._cached_fingerprint = fingerprint
+        normalized = re.sub(r"\s+", " ", user_input.strip().lower()).rstrip("?.! ")
+        return hashlib.sha256(
+            json.dumps([normalized, self.model, fingerprint]).encode("utf-8")
+        ).hexdigest()
 
-            if function_call["function"] == "query_database":
-                return self.sqlite_tool.execute_query(function_call["parameters"]["query"])
-            elif function_call["function"] == "list_tables":
-                return self.sqlite_tool.get_tables()
-            else:
-                raise ValueError(f"Unknown function: {function_call['function']}")
+    def _translate(self, user_input: str) -> Tuple[str, Dict[str, Any], bool]:
+        """
+        Turn a request into a function call, reusing cached translations;
+        returns the cache key, the function call and whether it came from the cache
+        """
+        key = self._cache_key(user_input)
+        function_call = self.translation_cache.get(key)
+        if function_call is not None:
+            return key, function_call, True
+        response = ollama_client.generate(model=self.model, prompt=self._generate_prompt(user_input))
+        return key, self._parse_ollama_response(response.response), False
+
+    def _store_translation(self, key: str, function_call: Dict[str, Any]):
+        """Cache a translation; called only after its function call ran without error"""
+        if function_call.get("function") in self.function_definitions:
+            self.translation_cache.put(key, function_call)
+
+    def _store_when_done(self, key: str, function_call: Dict[str, Any], batches: Iterator[List[tuple]]):
+        """Pass streamed row batches through and cache the translation once the query has run"""
+        stored = False
+        for batch in batches:
+            if not stored:
+                self._store_translation(key, function_call)
+                stored = True
+            yield batch
+        if not stored:
+            self._store_translation(key, function_call)
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for the translation cache"""
+        return self.translation_cache.stats()
+
+    def _dispatch(self, function_call: Dict[str, Any], stream: bool = False) -> Any:
+        """Run a parsed function call against the database"""
+        if function_call["function"] == "query_database":
+            batches = self.sqlite_tool.iter_query(
+                function_call["parameters"]["query"],
+                max_rows=self.max_rows,
+                max_bytes=self.max_bytes,
+            )
+            if stream:
+                return batches
+            return [row for batch in batches for row in batch]
+        elif function_call["function"] == "list_tables":
+            return self.sqlite_tool.get_tables()
+        else:
+            raise ValueError(f"Unknown function: {function_call['function']}")
+
+    def process_request(self, user_input: str, stream: bool = False) -> Any:
+        """
+        Translate a natural language request into a function call and run it
+
+        Query results are capped at max_rows / max_bytes. With stream=True a
+        query_database call returns an iterator of row batches instead of a list,
+        so the caller can consume results without holding them all in memory.
+        """
+        try:
+            key, function_call, cached = self._translate(user_input)
+            result = self._dispatch(function_call, stream)
+            if cached:
+                return result
+            if stream and function_call["function"] == "query_database":
+                return self._store_when_done(key, function_call, result)  # the SQL runs as it is consumed
+            self._store_translation(key, function_call)
+            return result
         except Exception as e:
             raise RuntimeError(f"Request processing failed: {str(e)}")
 
+    async def aprocess_requests(
+        self,
+        user_inputs: List[str],
+        max_concurrency: int = 4,
+        sql_workers: int = 4,
+    ) -> List[Dict[str, Any]]:
+        """
+        Process many requests concurrently
+
+        At most max_concurrency generation requests are in flight to the Ollama
+        server at once (match this to OLLAMA_NUM_PARALLEL); SQL runs in a pool of
+        sql_workers threads. Results are returned in input order as dicts with
+        "request", "result" and "error" keys; a failed request does not affect
+        the others.
+        """
+        client = ollama_client.async_client()
+        semaphore = asyncio.Semaphore(max_concurrency)
+        loop = asyncio.get_running_loop()
+
+        try:
+            with ThreadPoolExecutor(max_workers=sql_workers) as sql_pool:
+                async def run_one(user_input: str) -> Dict[str, Any]:
+                    try:
+                        key = await loop.run_in_executor(sql_pool, self._cache_key, user_input)
+                        function_call = self.translation_cache.get(key)
+                        cached = function_call is not None
+                        if not cached:
+                            prompt = await loop.run_in_executor(sql_pool, self._generate_prompt, user_input)
+                            async with semaphore, ollama_client.aslot(self.model, caller="tool_sqlite"):
+                                response = await client.generate(
+                                    model=self.model, prompt=prompt, keep_alive=ollama_client.keep_alive_for(self.model)
+                                )
+                            function_call = self._parse_ollama_response(response.response)
+                        result = await loop.run_in_executor(sql_pool, self._dispatch, function_call)
+                        if not cached:
+                            self._store_translation(key, function_call)
+                        return {"request": user_input, "result": result, "error": None}
+                    except Exception as e:
+                        return {"request": user_input, "result": None,
+                                "error": f"Request processing failed: {str(e)}"}
+
+                return await asyncio.gather(*(run_one(user_input) for user_input in user_inputs))
+        finally:
+            await client.close()  # its httpx connection pool
+
+    def process_requests(
+        self,
+        user_inputs: List[str],
+        max_concurrency: int = 4,
+        sql_workers: int = 4,
+    ) -> List[Dict[str, Any]]:
+        """Blocking wrapper around aprocess_requests"""
+        return asyncio.run(self.aprocess_requests(user_inputs, max_concurrency, sql_workers))
+
 def main():
     function_caller = OllamaFunctionCaller()
     queries = [
@@ -205,13 +1097,12 @@ def main():
         "What are the top 5 products by price?"
     ]
 
-    for query in queries:
-        try:
-            print(f"\nQuery: {query}")
-            result = function_caller.process_request(query)
-            print(f"Result: {result}")
-        except Exception as e:
-            print(f"Error processing query: {str(e)}")
+    for item in function_caller.process_requests(queries, max_concurrency=3):
+        print(f"\nQuery: {item['request']}")
+        if item["error"]:
+            print(f"Error processing query: {item['error']}")
+        else:
+            print(f"Result: {item['result']}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,9 +1,332 @@
 """
 Summarize text
+
+Text longer than the input budget (CHUNK_TOKENS, or less when the model's
+num_ctx is smaller) is summarized hierarchically: it is split on
+paragraph and sentence boundaries into chunks that fit the token budget, the
+chunks are summarized concurrently, and the partial summaries are combined
+FAN_OUT at a time until a single summary is left.
+
+summarize_text_stream yields the summary as the model generates it and
+records time to first token and tokens/sec; summarize_text joins the stream.
+
+Every chat call's result is cached under a hash of the model, prompt
+template, context and text, in memory and (when SUMMARY_CACHE_PATH is set or
+configure_summary_cache is given a path) in a SQLite file that several
+processes can share. Use bypass_summary_cache() to force fresh summaries.
 """
 
-from ollama import ChatResponse
-from ollama import chat
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import ollama_client
+from caching import TieredCache
+from token_budget import (
+    DEFAULT_RESERVE_TOKENS, MESSAGE_OVERHEAD_TOKENS, ContextOverflowError, context_length, count_message_tokens, count_tokens,
+    record_prompt, split_to_budget, trim_to_budget,
+)
+
+MODEL = "llama3.2:latest"
+CHUNK_TOKENS = 2000  # largest input sent in one chat call; lowered further if the model context is smaller
+FAN_OUT = 4  # partial summaries combined by one reduce call
+MAX_CONCURRENCY = 4  # chat calls in flight at once; match OLLAMA_NUM_PARALLEL on the server
+CACHE_SUMMARIES = True
+TOKEN_POLICY = "chunk"  # for text over the budget: "chunk" (map-reduce), "trim" or "raise"
+
+SUMMARIZE_PROMPT = "Summarize this text (and be concise), returning only the summary with NO OTHER COMMENTS:\n\n"
+REDUCE_PROMPT = (
+    "The following are summaries of consecutive parts of one document. Combine them into one "
+    "concise summary of the whole document, returning only the summary with NO OTHER COMMENTS:\n\n"
+)
+
+_cache: Optional[TieredCache] = None
+_cache_lock = threading.Lock()
+_bypass = contextvars.ContextVar("bypass_summary_cache", default=False)
+
+
+def configure_summary_cache(
+    path: Optional[str] = None,
+    max_entries: int = 1024,
+    max_bytes: int = 64 * 1024 * 1024,
+    disk_max_bytes: int = 256 * 1024 * 1024,
+) -> TieredCache:
+    """
+    Replace the summary cache: an in-memory LRU tier of max_entries / max_bytes
+    in front of an optional SQLite file at path, bounded to disk_max_bytes
+    """
+    global _cache
+    with _cache_lock:
+        _cache = TieredCache(max_entries, max_bytes, path, disk_max_bytes)
+        return _cache
+
+
+def _summary_cache() -> TieredCache:
+    if _cache is None:
+        configure_summary_cache(os.environ.get("SUMMARY_CACHE_PATH"))
+    return _cache
+
+
+@contextmanager
+def bypass_summary_cache():
+    """Summaries made inside this block neither read nor update the cache"""
+    token = _bypass.set(True)
+    try:
+        yield
+    finally:
+        _bypass.reset(token)
+
+
+def _use_cache(use_cache: Optional[bool]) -> bool:
+    return (CACHE_SUMMARIES and not _bypass.get()) if use_cache is None else use_cache
+
+
+def summary_cache_key(model: str, template: str, context: str, text: str) -> str:
+    return hashlib.sha256(json.dumps([model, template, context, text]).encode("utf-8")).hexdigest()
+
+
+def cached_summary(template: str, context: str, text: str, compute: Callable[[], str],
+                   model: str = MODEL, use_cache: Optional[bool] = None) -> str:
+    """Return the cached result of compute() for this model, template, context and text"""
+    if not _use_cache(use_cache):
+        return compute()
+    cache = _summary_cache()
+    key = summary_cache_key(model, template, context, text)
+    summary = cache.get(key)
+    if summary is None:
+        summary = compute()
+        cache.put(key, summary)
+    return summary
+
+
+def summary_cache_stats() -> Dict[str, Any]:
+    """Hits, misses and bytes of the summary cache, overall and per tier"""
+    if _cache is None:
+        return {}
+    tiers = _cache.stats()
+    memory, disk = tiers["memory"], tiers.get("disk")
+    hits = memory["hits"] + (disk["hits"] if disk else 0)
+    misses = disk["misses"] if disk else memory["misses"]
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+        "memory_bytes": memory["bytes"],
+        "disk_bytes": disk["bytes"] if disk else 0,
+        "tiers": tiers,
+    }
+
+
+def _system_prompt(context: str, prompt: str) -> str:
+    if len(context) > 50:
+        return f"Given this context:\n\n{context}\n\n" + prompt
+    return prompt
+
+
+def _input_budget(context: str, chunk_tokens: int = CHUNK_TOKENS) -> int:
+    """Tokens of text one chat call can take: chunk_tokens, or less if the model context is smaller"""
+    system = _system_prompt(context, REDUCE_PROMPT)
+    overhead = count_tokens(system, MODEL) + 2 * MESSAGE_OVERHEAD_TOKENS  # system and user messages
+    room = context_length(MODEL) - DEFAULT_RESERVE_TOKENS - overhead
+    return max(1, min(chunk_tokens, room))
+
+
+def split_text(text: str, max_tokens: int = CHUNK_TOKENS) -> List[str]:
+    """
+    Split text into chunks of at most max_tokens (estimated), breaking between
+    paragraphs where possible and between sentences otherwise
+    """
+    return split_to_budget(text, max_tokens, MODEL)
+
+
+def _chat_summary_stream(
+    text: str, context: str = "", prompt: str = SUMMARIZE_PROMPT,
+    stats: Optional[Dict[str, Any]] = None, use_cache: bool = True,
+) -> Iterator[str]:
+    """One streamed chat call summarizing text that fits in the model context"""
+    cache = _summary_cache() if use_cache else None
+    if cache is not None:
+        key = summary_cache_key(MODEL, prompt, context, text)
+        summary = cache.get(key)
+        if summary is not None:
+            if stats is not None:
+                stats.update({"ttft": 0.0, "seconds": 0.0, "tokens": 0, "tokens_per_sec": 0.0, "cached": True})
+            yield summary
+            return
+
+    messages = [
+        {"role": "system", "content": _system_prompt(context, prompt)},
+        {"role": "user", "content": text},
+    ]
+    start = time.perf_counter()
+    pieces = []
+    first_token = None
+    tokens = 0
+    eval_count = None
+    prompt_eval_count = None
+    for chunk in ollama_client.chat(model=MODEL, messages=messages, stream=True):
+        piece = chunk["message"]["content"]
+        if piece:
+            if first_token is None:
+                first_token = time.perf_counter()
+            tokens += 1
+            pieces.append(piece)
+            yield piece
+        if chunk.get("done"):
+            eval_count = chunk.get("eval_count")
+            prompt_eval_count = chunk.get("prompt_eval_count")
+    record_prompt(MODEL, count_message_tokens(messages, MODEL), "summarize_text", reported_tokens=prompt_eval_count)
+    if cache is not None:
+        cache.put(key, "".join(pieces))
+    if stats is not None:
+        end = time.perf_counter()
+        tokens = eval_count or tokens
+        generating = end - first_token if first_token is not None else 0.0
+        stats.update({
+            "ttft": first_token - start if first_token is not None else None,
+            "seconds": end - start,
+            "tokens": tokens,
+            "tokens_per_sec": tokens / generating if generating > 0 else 0.0,
+            "cached": False,
+        })
+
+
+def _chat_summary(text: str, context: str = "", prompt: str = SUMMARIZE_PROMPT, use_cache: bool = True) -> str:
+    """One chat call summarizing text that fits in the model context"""
+    return "".join(_chat_summary_stream(text, context, prompt, use_cache=use_cache))
+
+
+def _run_level(prompt: str, inputs: List[str], context: str, max_concurrency: int,
+               levels: List[Dict[str, Any]], use_cache: bool) -> List[str]:
+    """Summarize every input concurrently and record the level's timing in levels"""
+    level_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(inputs)))) as pool:
+        outputs = list(pool.map(lambda part: _chat_summary(part, context, prompt, use_cache), inputs))
+    levels.append({
+        "level": len(levels),
+        "input_tokens": sum(count_tokens(part, MODEL) for part in inputs),
+        "calls": len(inputs),
+        "seconds": time.perf_counter() - level_start,
+    })
+    logging.info(
+        f"summarize level {levels[-1]['level']}: {len(inputs)} calls, "
+        f"~{levels[-1]['input_tokens']} input tokens, {levels[-1]['seconds']:.2f} sec"
+    )
+    return outputs
+
+
+def _group(summaries: List[str], fan_out: int, chunk_tokens: int) -> List[List[str]]:
+    """Group neighbouring summaries, at most fan_out per group and within the token budget"""
+    groups: List[List[str]] = []
+    for summary in summaries:
+        if groups and len(groups[-1]) < fan_out and (
+            len(groups[-1]) < 2
+            or count_tokens("\n\n".join(groups[-1] + [summary]), MODEL) <= chunk_tokens
+        ):
+            groups[-1].append(summary)
+        else:
+            groups.append([summary])
+    return groups
+
+
+def _partial_summaries(text: str, context: str, chunk_tokens: int, fan_out: int,
+                       max_concurrency: int, levels: List[Dict[str, Any]], use_cache: bool) -> List[str]:
+    """Map over the chunks, then reduce until the summaries left fit in one final call"""
+    summaries = _run_level(SUMMARIZE_PROMPT, split_text(text, chunk_tokens), context, max_concurrency,
+                           levels, use_cache)
+    while len(summaries) > 1:
+        groups = _group(summaries, fan_out, chunk_tokens)
+        if len(groups) == 1:
+            break
+        merged = iter(_run_level(REDUCE_PROMPT, ["\n\n".join(group) for group in groups if len(group) > 1],
+                                 context, max_concurrency, levels, use_cache))
+        summaries = [next(merged) if len(group) > 1 else group[0] for group in groups]
+    return summaries
+
+
+def summarize_long_text(
+    text: str,
+    context: str = "",
+    chunk_tokens: int = CHUNK_TOKENS,
+    fan_out: int = FAN_OUT,
+    max_concurrency: int = MAX_CONCURRENCY,
+    use_cache: Optional[bool] = None,
+) -> Dict[str, Any]:
+    """
+    Map-reduce summarization of text of any length
+
+    Args:
+        text (str): text to summarize
+        context (str): optional context passed to every chat call
+        chunk_tokens (int): token budget of each chat call's input (capped to fit the model context)
+        fan_out (int): number of partial summaries combined by one reduce call (at least 2)
+        max_concurrency (int): chat calls in flight at once
+        use_cache (bool): read and update the summary cache; defaults to
+            CACHE_SUMMARIES unless inside bypass_summary_cache()
+
+    Returns:
+        dict with "summary", "seconds" and "levels": one dict per level with
+        "level" (0 is the map over chunks), "input_tokens", "calls" and "seconds"
+    """
+    use_cache = _use_cache(use_cache)
+    chunk_tokens = _input_budget(context, chunk_tokens)
+    start = time.perf_counter()
+    levels: List[Dict[str, Any]] = []
+    summaries = _partial_summaries(text, context, chunk_tokens, max(2, fan_out), max_concurrency, levels, use_cache)
+    if len(summaries) > 1:
+        summaries = _run_level(REDUCE_PROMPT, ["\n\n".join(summaries)], context, max_concurrency, levels, use_cache)
+    return {
+        "summary": summaries[0] if summaries else "",
+        "seconds": time.perf_counter() - start,
+        "levels": levels,
+    }
+
+
+def summarize_text_stream(
+    text: str, context: str = "", stats: Optional[Dict[str, Any]] = None, use_cache: Optional[bool] = None
+) -> Iterator[str]:
+    """
+    Summarizes text, yielding the summary in pieces as the model generates it
+
+    Text over the input budget is handled by TOKEN_POLICY: "chunk" reduces it
+    with map-reduce first (see summarize_long_text) and streams only the final
+    call, "trim" cuts out its middle and "raise" raises ContextOverflowError.
+
+    Parameters:
+        text (str): text to summarize
+        context (str): optional context string
+        stats (dict): if given, filled in when the stream ends with "ttft" (seconds
+            to the first token of the final call), "seconds", "tokens", "tokens_per_sec"
+            and "cached"
+        use_cache (bool): read and update the summary cache; defaults to
+            CACHE_SUMMARIES unless inside bypass_summary_cache()
+
+    Returns:
+        an iterator of summary text pieces
+    """
+    use_cache = _use_cache(use_cache)
+    if len(text.strip()) < 50:
+        text, context = context, ""  # summarize the context itself
+    prompt = SUMMARIZE_PROMPT
+    budget = _input_budget(context)
+    tokens = count_tokens(text, MODEL)
+    if tokens > budget:
+        if TOKEN_POLICY == "raise":
+            raise ContextOverflowError(f"summarize_text: ~{tokens} tokens of text, the budget is {budget}")
+        if TOKEN_POLICY == "trim":
+            text = trim_to_budget(text, budget, MODEL)
+        else:
+            summaries = _partial_summaries(text, context, budget, FAN_OUT, MAX_CONCURRENCY, [], use_cache)
+            text = "\n\n".join(summaries)
+            prompt = REDUCE_PROMPT if len(summaries) > 1 else SUMMARIZE_PROMPT
+    yield from _chat_summary_stream(text, context, prompt, stats, use_cache)
 
 
 def summarize_text(text: str, context: str = "") -> str:
@@ -18,20 +341,7 @@ def summarize_text(text: str, context: str = "") -> str:
         a string of summarized text
 
     """
-    prompt = "Summarize this text (and be concise), returning only the summary with NO OTHER COMMENTS:\n\n"
-    if len(text.strip()) < 50:
-        text = context
-    elif len(context) > 50:
-        prompt = f"Given this context:\n\n{context}\n\n" + prompt
-
-    summary: ChatResponse = chat(
-        model="llama3.2:latest",
-        messages=[
-            {"role": "system", "content": prompt},
-            {"role": "user", "content": text},
-        ],
-    )
-    return summary["message"]["content"]
+    return "".join(summarize_text_stream(text, context))
 
 
 # Function metadata for Ollama integration
@@ -43,4 +353,7 @@ summarize_text.metadata = {
 }
 
 # Export the functions
-__all__ = ["summarize_text"]
+__all__ = [
+    "summarize_text", "summarize_text_stream", "summarize_long_text", "split_text",
+    "configure_summary_cache", "bypass_summary_cache", "cached_summary", "summary_cache_stats",
+]
@@ -3,36 +3,187 @@ Provides functions for web searching and HTML to Markdown conversion
 and for returning the contents of a URI as plain text (with minimal markdown)
 """
 
-from typing import Dict, Any
-import requests
-from bs4 import BeautifulSoup
+from typing import Dict, Any, Iterator, List, Optional
 import re
 from urllib.parse import urlparse
-import html
-from ollama import chat
 import json
-from tool_summarize_text import summarize_text
+from http_client import http_get, is_request_error
+from caching import DiskCache, LRUCache
+from html_markdown import convert_html, default_engine
 
-import requests
 import os
 import logging
-from pprint import pprint
-from bs4 import BeautifulSoup
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, as_completed, wait
 
-logging.basicConfig(level=logging.INFO)
+# Heavy dependencies (requests, bs4, ollama via tool_summarize_text) and the
+# Brave API key are loaded on first use, so importing this module is cheap and
+# works without BRAVE_SEARCH_API_KEY set.
 
-api_key = os.environ.get("BRAVE_SEARCH_API_KEY")
-if not api_key:
-    raise ValueError(
-        "API key not found. Set 'BRAVE_SEARCH_API_KEY' environment variable."
-    )
+HTML_ENGINE = None  # None picks the fastest available engine, see html_markdown.convert_html
+MAX_PAGE_BYTES = 2 * 1024 * 1024  # stop downloading a page after this many bytes
+MAIN_CONTENT_ONLY = True  # drop navigation, footers, banners etc. before text reaches the LLM
+
+
+def brave_api_key() -> str:
+    """The Brave search API key from the BRAVE_SEARCH_API_KEY environment variable"""
+    api_key = os.environ.get("BRAVE_SEARCH_API_KEY")
+    if not api_key:
+        raise ValueError(
+            "API key not found. Set 'BRAVE_SEARCH_API_KEY' environment variable."
+        )
+    return api_key
 
 
 def replace_html_tags_with_text(html_string):
+    from bs4 import BeautifulSoup
+
     soup = BeautifulSoup(html_string, "html.parser")
     return soup.get_text()
 
 
+class PageCache:
+    """
+    Persistent cache of uri_to_markdown results keyed on URL, HTML_ENGINE and MAIN_CONTENT_ONLY
+
+    Entries younger than ttl seconds are returned without any network traffic.
+    Older entries are revalidated with If-None-Match / If-Modified-Since; on a
+    304 response the stored markdown is reused without re-parsing. The file is
+    bounded to max_bytes with least-recently-used eviction.
+    """
+
+    def __init__(self, path: str = "web_cache.db", ttl: float = 3600, max_bytes: int = 256 * 1024 * 1024):
+        self.ttl = ttl
+        self.store = DiskCache(path, max_bytes)
+        self.stats = {"fresh_hits": 0, "revalidated": 0, "fetched": 0, "stored": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, name: str):
+        with self._lock:
+            self.stats[name] += 1
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.stats, **{f"disk_{k}": v for k, v in self.store.stats().items()}}
+
+
+_page_cache = None
+
+
+def enable_page_cache(path: str = "web_cache.db", ttl: float = 3600, max_bytes: int = 256 * 1024 * 1024) -> PageCache:
+    """Turn on the persistent uri_to_markdown cache (see PageCache)"""
+    global _page_cache
+    _page_cache = PageCache(path, ttl, max_bytes)
+    return _page_cache
+
+
+def page_cache_stats() -> Dict[str, Any]:
+    return _page_cache.report() if _page_cache is not None else {}
+
+
+def _read_limited(response, max_bytes: int) -> str:
+    """Read at most max_bytes of a streamed response body and decode it"""
+    chunks = []
+    size = 0
+    for chunk in response.iter_content(chunk_size=64 * 1024):
+        chunks.append(chunk)
+        size += len(chunk)
+        if size >= max_bytes:
+            break
+    response.close()
+    body = b"".join(chunks)[:max_bytes]
+    charset = re.search(r"charset=([\w-]+)", response.headers.get("Content-Type", ""))
+    try:
+        return body.decode(charset.group(1) if charset else "utf-8", errors="replace")
+    except LookupError:  # unknown charset name
+        return body.decode("utf-8", errors="replace")
+
+
+def _format_page(a_uri: str, page: Dict[str, Any]) -> str:
+    """Render a convert_html result as the text returned by uri_to_markdown"""
+    if "stats" in page:
+        stats = page["stats"]
+        logging.info(
+            f"{a_uri}: kept {stats['chars_out']} of {stats['chars_in']} characters, "
+            f"saved ~{stats['tokens_saved_estimate']} tokens"
+        )
+    return f"Contents of URI {a_uri} is:\n# {page['title']}\n\n{page['markdown']}\n"
+
+
+def _html_to_markdown(a_uri: str, html_text: str) -> str:
+    page = convert_html(html_text, HTML_ENGINE, base_url=a_uri, main_content=MAIN_CONTENT_ONLY)
+    return _format_page(a_uri, page)
+
+
+def _is_valid_uri(a_uri: str) -> bool:
+    parsed = urlparse(a_uri)
+    return all([parsed.scheme, parsed.netloc])
+
+
+def _page_key(a_uri: str) -> str:
+    """Page cache key; the stored markdown depends on the conversion settings as well as the URL"""
+    return json.dumps([a_uri, HTML_ENGINE or default_engine(), MAIN_CONTENT_ONLY])
+
+
+def _fetch_page(a_uri: str) -> Dict[str, Any]:
+    """
+    Fetch a URI, answering from the page cache when possible
+
+    Returns {"markdown": ...} when the cache already has the converted page,
+    otherwise {"html": ..., "validators": ...} for the caller to convert and
+    pass to _store_page. Raises requests.RequestException for network and
+    HTTP errors.
+    """
+    cache = _page_cache
+    cached = cache.store.get(_page_key(a_uri)) if cache is not None else None
+    if cached is not None and time.time() - cached["fetched_at"] < cache.ttl:
+        cache._count("fresh_hits")
+        return {"markdown": cached["markdown"]}
+
+    # Fetch content, revalidating a stale cache entry if we have validators
+    headers = {}
+    if cached is not None:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+    response = http_get(a_uri, headers=headers or None, stream=True)
+
+    if cached is not None and response.status_code == 304:
+        response.close()
+        cache._count("revalidated")
+        cache.store.put(_page_key(a_uri), {**cached, "fetched_at": time.time()})
+        return {"markdown": cached["markdown"]}
+    if not response.ok:
+        response.close()  # release the streamed connection back to the pool
+    response.raise_for_status()
+
+    return {
+        "html": _read_limited(response, MAX_PAGE_BYTES),
+        "validators": {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "no_store": "no-store" in response.headers.get("Cache-Control", ""),
+        },
+    }
+
+
+def _store_page(a_uri: str, markdown: str, validators: Dict[str, Any]):
+    cache = _page_cache
+    if cache is None:
+        return
+    cache._count("fetched")
+    if not validators["no_store"]:
+        cache.store.put(_page_key(a_uri), {
+            "markdown": markdown,
+            "etag": validators["etag"],
+            "last_modified": validators["last_modified"],
+            "fetched_at": time.time(),
+        })
+        cache._count("stored")
+
+
 def uri_to_markdown(a_uri: str) -> Dict[str, Any]:
     """
     Fetches content from a URI and converts HTML to markdown-style text
@@ -45,39 +196,90 @@ def uri_to_markdown(a_uri: str) -> Dict[str, Any]:
     """
     try:
         # Validate URI
-        parsed = urlparse(a_uri)
-        if not all([parsed.scheme, parsed.netloc]):
+        if not _is_valid_uri(a_uri):
             return f"Invalid URI: {a_uri}"
 
-        # Fetch content
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-        }
-        response = requests.get(a_uri, headers=headers, timeout=10)
-        response.raise_for_status()
+        fetched = _fetch_page(a_uri)
+        if "markdown" in fetched:
+            return fetched["markdown"]
+        markdown = _html_to_markdown(a_uri, fetched["html"])
+        _store_page(a_uri, markdown, fetched["validators"])
+        return markdown
 
-        # Parse HTML
-        soup = BeautifulSoup(response.text, "html.parser")
+    except Exception as e:
+        if is_request_error(e):
+            return f"Network error: {str(e)}"
+        return f"Error processing URI: {str(e)}"
 
-        # Get title
-        title = soup.title.string if soup.title else ""
 
-        # Get text and clean up
-        text = soup.get_text()
+def uris_to_markdown(
+    uris: List[str], workers: Optional[int] = None, fetch_workers: int = 16
+) -> Iterator[Dict[str, Any]]:
+    """
+    Converts many URIs, fetching concurrently on threads and converting HTML in a process pool
 
-        # Clean up the text
-        text = re.sub(r"\n\s*\n", "\n\n", text)  # Remove multiple blank lines
-        text = re.sub(r" +", " ", text)  # Remove multiple spaces
-        text = html.unescape(text)  # Convert HTML entities
-        text = text.strip()
+    Parsing is CPU bound and serialized by the GIL when done on threads, so
+    each fetched page is handed to one of `workers` processes (default: one
+    per CPU; workers=0 parses on the fetch threads instead). The workers are
+    started with forkserver (spawn where that is unavailable), never by forking
+    this multithreaded process, so a script calling this needs the usual
+    `if __name__ == "__main__":` guard. Results are yielded as each page finishes.
 
-        return f"Contents of URI {a_uri} is:\n# {title}\n\n{text}\n"
+    Yields:
+        dicts with "uri", "markdown" (None on failure) and "error" (None on success)
+    """
+    def fetch(a_uri):
+        fetched = _fetch_page(a_uri)
+        if workers == 0 and "html" in fetched:
+            fetched["markdown"] = _html_to_markdown(a_uri, fetched["html"])
+            _store_page(a_uri, fetched["markdown"], fetched["validators"])
+        return fetched
+
+    def error_message(e: Exception) -> str:
+        if is_request_error(e):
+            return f"Network error: {str(e)}"
+        return f"Error processing URI: {str(e)}"
 
-    except requests.RequestException as e:
-        return f"Network error: {str(e)}"
+    parsers = None
+    if workers != 0:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
 
-    except Exception as e:
-        return f"Error processing URI: {str(e)}"
+        # forking after the fetch threads start could copy locks they hold (urllib3, logging, the page cache)
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        parsers = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method))
+    try:
+        with ThreadPoolExecutor(max_workers=fetch_workers) as fetchers:
+            pending = {}
+            for a_uri in uris:
+                if _is_valid_uri(a_uri):
+                    pending[fetchers.submit(fetch, a_uri)] = ("fetch", a_uri, None)
+                else:
+                    yield {"uri": a_uri, "markdown": None, "error": f"Invalid URI: {a_uri}"}
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage, a_uri, validators = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        yield {"uri": a_uri, "markdown": None, "error": error_message(e)}
+                        continue
+                    if stage == "fetch" and "markdown" not in result:
+                        parse = parsers.submit(
+                            convert_html, result["html"], HTML_ENGINE, a_uri, MAIN_CONTENT_ONLY
+                        )
+                        pending[parse] = ("parse", a_uri, result["validators"])
+                        continue
+                    if stage == "parse":
+                        markdown = _format_page(a_uri, result)
+                        _store_page(a_uri, markdown, validators)
+                    else:
+                        markdown = result["markdown"]
+                    yield {"uri": a_uri, "markdown": markdown, "error": None}
+    finally:
+        if parsers is not None:
+            parsers.shutdown(cancel_futures=True)
 
 
 def search_web(query: str, max_results: int = 5) -> str:
@@ -104,16 +306,91 @@ def search_web(query: str, max_results: int = 5) -> str:
     }
 
 
-def brave_search_summaries(
-    query,
-    num_results=3,
-    url="https://api.search.brave.com/res/v1/web/search",
-    api_key=api_key,
-):
+class SearchCache:
+    """
+    TTL cache of Brave search results with single-flight request coalescing
+
+    Results are keyed on the normalized query (case-folded, whitespace
+    collapsed), the result count and the endpoint URL. When several threads ask
+    for the same key at once only the first one calls the API; the others wait
+    for its result. Failed calls are not cached.
+    """
+
+    def __init__(self, ttl: float = 600, max_entries: int = 1024):
+        self.results = LRUCache(max_entries=max_entries, ttl=ttl)
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "api_calls": 0, "api_errors": 0,
+                      "rate_limit_remaining": None}
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(query: str, num_results: int, url: str) -> str:
+        return json.dumps([" ".join(query.casefold().split()), num_results, url])
+
+    def lookup(self, key: str, fetch):
+        """Return the cached results for key, or call fetch() once for all concurrent callers"""
+        with self._lock:
+            cached = self.results.get(key)
+            if cached is not None:
+                self.stats["hits"] += 1
+                return [dict(result) for result in cached]
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+                self.stats["misses"] += 1
+            else:
+                self.stats["coalesced"] += 1
+        if not leader:
+            return [dict(result) for result in future.result()]
+        try:
+            results, ok = fetch()
+            if ok:
+                self.results.put(key, results)
+            future.set_result(results)
+            return [dict(result) for result in results]
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+        requests_served = stats["hits"] + stats["misses"] + stats["coalesced"]
+        stats["hit_rate"] = (stats["hits"] + stats["coalesced"]) / requests_served if requests_served else 0.0
+        stats["entries"] = len(self.results)
+        return stats
+
+
+_search_cache = SearchCache()
+
+
+def configure_search_cache(ttl: float = 600, max_entries: int = 1024) -> SearchCache:
+    """Replace the Brave search cache; ttl=0 disables caching but keeps request coalescing"""
+    global _search_cache
+    _search_cache = SearchCache(ttl, max_entries)
+    return _search_cache
+
+
+def search_cache_stats() -> Dict[str, Any]:
+    """Hit rate and API usage of brave_search_summaries"""
+    return _search_cache.report()
+
+
+def _brave_request(query, num_results, url, api_key):
+    """Call the Brave search API; returns (results, ok)"""
+    cache = _search_cache
     headers = {"X-Subscription-Token": api_key, "Content-Type": "application/json"}
     params = {"q": query, "count": num_results}
 
-    response = requests.get(url, headers=headers, params=params)
+    response = http_get(url, headers=headers, params=params)
+    with cache._lock:
+        cache.stats["api_calls"] += 1
+        if "X-RateLimit-Remaining" in response.headers:
+            cache.stats["rate_limit_remaining"] = response.headers["X-RateLimit-Remaining"]
     ret = []
 
     if response.status_code == 200:
@@ -127,26 +404,87 @@ def brave_search_summaries(
             for result in search_results.get("web", {}).get("results", [])
         ]
         logging.info("Successfully retrieved results.")
-    else:
+        return ret, True
+
+    with cache._lock:
+        cache.stats["api_errors"] += 1
+    try:
+        error_info = response.json()
+        logging.error(f"Error {response.status_code}: {error_info.get('message')}")
+    except json.JSONDecodeError:
+        logging.error(f"Error {response.status_code}: {response.text}")
+    return ret, False
+
+
+def brave_search_summaries(
+    query,
+    num_results=3,
+    url="https://api.search.brave.com/res/v1/web/search",
+    api_key=None,
+):
+    api_key = api_key or brave_api_key()
+    cache = _search_cache
+    return cache.lookup(
+        cache.key(query, num_results, url),
+        lambda: _brave_request(query, num_results, url, api_key),
+    )
+
+
+def _summarize_for_query(query: str, text: str) -> str:
+    from tool_summarize_text import summarize_text
+
+    return summarize_text(
+        f"Given the query:\n\n{query}\n\nthen, summarize text removing all material that is not relevant to the query and then be very concise for a very short summary:\n\n{text}\n"
+    )
+
+
+def brave_search_text_stream(
+    query, num_results=3, max_workers=8, per_host_limit=2, max_summaries=4
+):
+    """
+    Searches with Brave, then fetches and summarizes every result page concurrently
+
+    Each page is summarized as soon as it has been fetched, so fetches and
+    summaries overlap. Results are yielded in completion order.
+
+    Args:
+        query (str): search query
+        num_results (int): number of search results to fetch
+        max_workers (int): maximum number of pages fetched or summarized at once
+        per_host_limit (int): maximum concurrent fetches from a single host
+        max_summaries (int): maximum concurrent summarize_text calls to Ollama
+
+    Yields:
+        dicts with "rank" (position in the search results), "title", "url",
+        "description" and "summary" keys
+    """
+    results = brave_search_summaries(query, num_results)
+    host_limits = {
+        urlparse(r["url"]).netloc: threading.BoundedSemaphore(per_host_limit) for r in results
+    }
+    summary_limit = threading.BoundedSemaphore(max_summaries)
+
+    def fetch_and_summarize(rank, result):
+        with host_limits[urlparse(result["url"]).netloc]:
+            text = uri_to_markdown(result["url"])
         try:
-            error_info = response.json()
-            logging.error(f"Error {response.status_code}: {error_info.get('message')}")
-        except json.JSONDecodeError:
-            logging.error(f"Error {response.status_code}: {response.text}")
+            with summary_limit:
+                summary = _summarize_for_query(query, text)
+        except Exception as e:
+            summary = f"Error summarizing {result['url']}: {str(e)}"
+        return {"rank": rank, **result, "summary": summary}
 
-    return ret
+    if not results:
+        return
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(results)))) as pool:
+        futures = [pool.submit(fetch_and_summarize, rank, r) for rank, r in enumerate(results)]
+        for future in as_completed(futures):
+            yield future.result()
 
 
 def brave_search_text(query, num_results=3):
-    summaries = brave_search_summaries(query, num_results)
-    ret = ""
-    for s in summaries:
-        url = s["url"]
-        text = uri_to_markdown(url)
-        summary = summarize_text(
-            f"Given the query:\n\n{query}\n\nthen, summarize text removing all material that is not relevant to the query and then be very concise for a very short summary:\n\n{text}\n"
-        )
-        ret += ret + summary
+    items = sorted(brave_search_text_stream(query, num_results), key=lambda item: item["rank"])
+    ret = "\n\n".join(item["summary"] for item in items)
     print("\n\n-----------------------------------")
     return ret
 